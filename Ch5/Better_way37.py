@@ -124,34 +124,48 @@ from collections import namedtuple
 Grade = namedtuple('Grade', ('score', 'weight'))
 
 # 일련의 점수를 포함하는 단일 과목을 표현하는 클래스를 작성할 수 있다.
+# 평균을 물을 때마다 모든 점수를 다시 더하지 않도록, 점수를 받을 때 가중 합계와 가중치 합계를 함께 갱신한다.
 class Subject:
     def __init__(self):
         self._grades = []
+        self.total = 0
+        self.total_weight = 0
+        self._on_change = None  # 이 과목을 가진 학생이 캐시를 무효화하도록 등록하는 콜백
     
     def report_grade(self, score, weight):
         self._grades.append(Grade(score, weight))
+        self.total += score * weight
+        self.total_weight += weight
+        if self._on_change is not None:
+            self._on_change()
     
     def average_grade(self):
-        total, total_weight = 0, 0
-        for grade in self._grades:
-            total += grade.score * grade.weight
-            total_weight += grade.weight
-        return total / total_weight
+        return self.total / self.total_weight
 
 # 한 학생이 수강하는 과목들을 표현하는 클래스를 작성할 수 있다.
+# 계산한 평균은 캐시해 두고, 과목이 새로 생기거나 어느 과목에 점수가 추가될 때만 버린다.
 class Student:
     def __init__(self):
         self._subjects = defaultdict(Subject)
+        self._average = None
 
     def get_subject(self, name):
+        if name not in self._subjects:
+            self._subjects[name]._on_change = self._invalidate
+            self._invalidate()
         return self._subjects[name]
+
+    def _invalidate(self):
+        self._average = None
     
     def average_grade(self):
-        total, count = 0, 0
-        for subject in self._subjects.values():
-            total += subject.average_grade()
-            count += 1
-        return total / count
+        if self._average is None:
+            total, count = 0, 0
+            for subject in self._subjects.values():
+                total += subject.average_grade()
+                count += 1
+            self._average = total / count
+        return self._average
 
 # 모든 학생을 저장하는 컨테이너를 작성할 수 있다.
 class Gradebook:
@@ -171,4 +185,201 @@ math.report_grade(70, 0.80)
 gym = albert.get_subject('체육')
 gym.report_grade(100, 0.40)
 gym.report_grade(85, 0.60)
-print(albert.average_grade())
\ No newline at end of file
+print(albert.average_grade())
+
+# 평균을 다시 물으면 캐시된 값을 돌려주고, 점수가 추가되면 새로 계산한다.
+assert albert.average_grade() == albert.average_grade()
+gym.report_grade(100, 1.0)
+assert albert.average_grade() == (math.average_grade() + gym.average_grade()) / 2
+print(albert.average_grade())
+
+# 점수가 수백만 개로 늘어나면 점수마다 namedtuple을 하나씩 만들고 학생마다 defaultdict를 두는 방식은 메모리를 너무 많이 쓴다.
+# 학생과 과목 이름은 정수 ID로 바꿔 한 번만 저장하고, 점수와 가중치는 array('d') 열에 차례로 쌓는다.
+# 평균은 numpy로 열 전체를 한꺼번에 집계해서 구한다. 학생 평균은 위 Gradebook과 마찬가지로 과목별 가중 평균의 평균이다.
+import itertools
+import sys
+import time
+from array import array
+
+import numpy as np
+
+class ColumnarGradebook:
+    def __init__(self):
+        self._student_ids = {}
+        self._student_names = []
+        self._subject_ids = {}
+        self._subject_names = []
+        self._students = array('i')
+        self._subjects = array('i')
+        self._scores = array('d')
+        self._weights = array('d')
+
+    def _intern(self, ids, names, name):
+        name_id = ids.get(name)
+        if name_id is None:
+            name_id = len(names)
+            name = sys.intern(name)
+            ids[name] = name_id
+            names.append(name)
+        return name_id
+
+    # 실패한 묶음에서 새로 등록한 이름을 지운다.
+    def _forget(self, ids, names, count):
+        for name in names[count:]:
+            del ids[name]
+        del names[count:]
+
+    def report_grade(self, student, subject, score, weight):
+        self.report_grades([(student, subject, score, weight)])
+
+    # rows는 (학생, 과목, 점수, 가중치) 튜플의 이터러블이다.
+    # batch_size 개씩 잘라 열마다 작은 array를 만든 다음 한 번에 extend 하므로, 입력이 아무리 커도 추가로 쓰는 메모리는 묶음 하나 크기다.
+    # 묶음의 네 열을 모두 만든 뒤에 붙이므로, 중간에 잘못된 행이 있어도 열 길이가 어긋나지 않는다.
+    # 잘못된 행이 있으면 그 묶음에서 새로 등록한 학생과 과목도 되돌린다. 점수가 없는 학생이 남으면 평균이 nan이 된다.
+    def report_grades(self, rows, batch_size=65536):
+        rows = iter(rows)
+        while batch := list(itertools.islice(rows, batch_size)):
+            student_count = len(self._student_names)
+            subject_count = len(self._subject_names)
+            try:
+                scores = array('d', (row[2] for row in batch))
+                weights = array('d', (row[3] for row in batch))
+                students = array('i', (self._intern(
+                    self._student_ids, self._student_names, row[0])
+                    for row in batch))
+                subjects = array('i', (self._intern(
+                    self._subject_ids, self._subject_names, row[1])
+                    for row in batch))
+            except BaseException:
+                self._forget(self._student_ids, self._student_names,
+                             student_count)
+                self._forget(self._subject_ids, self._subject_names,
+                             subject_count)
+                raise
+            self._students.extend(students)
+            self._subjects.extend(subjects)
+            self._scores.extend(scores)
+            self._weights.extend(weights)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in
+                   (self._students, self._subjects, self._scores, self._weights))
+
+    # array의 버퍼를 복사 없이 numpy 배열로 본다.
+    def _columns(self):
+        return (np.frombuffer(self._students, dtype=np.int32),
+                np.frombuffer(self._subjects, dtype=np.int32),
+                np.frombuffer(self._scores),
+                np.frombuffer(self._weights))
+
+    def average_grade(self, student):
+        students, subjects, scores, weights = self._columns()
+        mask = students == self._student_ids[student]
+        subjects = subjects[mask]
+        weights = weights[mask]
+        count = len(self._subject_names)
+        totals = np.bincount(subjects, scores[mask] * weights, count)
+        total_weights = np.bincount(subjects, weights, count)
+        taken = total_weights > 0
+        return float(np.mean(totals[taken] / total_weights[taken]))
+
+    def subject_average(self, subject):
+        _, subjects, scores, weights = self._columns()
+        mask = subjects == self._subject_ids[subject]
+        weights = weights[mask]
+        return float(np.dot(scores[mask], weights) / weights.sum())
+
+    # 모든 학생의 평균을 한 번에 구한다. (학생, 과목) 쌍마다 가중 합계를 bincount로 모은 다음, 학생별로 과목 평균을 평균한다.
+    # 가능한 쌍의 수가 점수 수보다 훨씬 많을 때만 np.unique로 실제 나온 쌍을 추린다.
+    def average_grades(self):
+        students, subjects, scores, weights = self._columns()
+        student_count = len(self._student_names)
+        subject_count = len(self._subject_names)
+        pairs = students.astype(np.int64) * subject_count + subjects
+        if student_count * subject_count <= 2 * len(pairs):
+            totals = np.bincount(pairs, scores * weights,
+                                 student_count * subject_count)
+            total_weights = np.bincount(pairs, weights,
+                                        student_count * subject_count)
+            pairs = np.flatnonzero(total_weights)
+            totals = totals[pairs]
+            total_weights = total_weights[pairs]
+        else:
+            pairs, pair_index = np.unique(pairs, return_inverse=True)
+            totals = np.bincount(pair_index, scores * weights)
+            total_weights = np.bincount(pair_index, weights)
+        pair_students = pairs // subject_count
+        sums = np.bincount(pair_students, totals / total_weights, student_count)
+        counts = np.bincount(pair_students, minlength=student_count)
+        return dict(zip(self._student_names, (sums / counts).tolist()))
+
+# 같은 점수를 넣으면 Gradebook과 같은 평균이 나온다.
+columnar = ColumnarGradebook()
+columnar.report_grades([
+    ('알버트 아인슈타인', '수학', 75, 0.05),
+    ('알버트 아인슈타인', '수학', 65, 0.15),
+    ('알버트 아인슈타인', '수학', 70, 0.80),
+    ('알버트 아인슈타인', '체육', 100, 0.40),
+    ('알버트 아인슈타인', '체육', 85, 0.60),
+    ('알버트 아인슈타인', '체육', 100, 1.0),
+])
+assert abs(columnar.average_grade('알버트 아인슈타인') -
+           albert.average_grade()) < 1e-9
+print(columnar.average_grade('알버트 아인슈타인'))
+
+# 잘못된 행이 있는 묶음은 통째로 버려지고, 그 묶음에서 처음 나온 학생도 남지 않는다.
+for bad_row in [('아이작 뉴턴', '물리', '점수 없음', 1.0),
+                ('아이작 뉴턴', ['물리'], 80, 1.0)]:
+    try:
+        columnar.report_grades([('아이작 뉴턴', '물리', 90, 1.0), bad_row])
+    except TypeError:
+        pass
+    else:
+        assert False
+assert len(columnar) == 6
+assert list(columnar.average_grades()) == ['알버트 아인슈타인']
+
+# 학생 10만 명, 과목 20개에 점수 100만 개를 넣고 메모리와 집계 시간을 잰다. 열 하나에 점수 하나당 24바이트만 쓴다.
+import random
+
+student_names = [f'학생{i}' for i in range(100_000)]
+subject_names = [f'과목{i}' for i in range(20)]
+rows = [(random.choice(student_names), random.choice(subject_names),
+         random.randint(0, 100), random.random() + 0.01)
+        for _ in range(1_000_000)]
+
+start = time.perf_counter()
+columnar = ColumnarGradebook()
+columnar.report_grades(rows)
+ingest_delta = time.perf_counter() - start
+
+start = time.perf_counter()
+columnar.average_grade(student_names[0])
+student_delta = time.perf_counter() - start
+
+start = time.perf_counter()
+columnar.subject_average(subject_names[0])
+subject_delta = time.perf_counter() - start
+
+start = time.perf_counter()
+averages = columnar.average_grades()
+all_delta = time.perf_counter() - start
+
+book = Gradebook()
+for student, subject, score, weight in rows[:50_000]:
+    book.get_student(student).get_subject(subject).report_grade(score, weight)
+check = ColumnarGradebook()
+check.report_grades(rows[:50_000])
+check_averages = check.average_grades()
+for name in list(check_averages)[:100]:
+    assert abs(check_averages[name] -
+               book.get_student(name).average_grade()) < 1e-9
+
+print(f'점수 {len(columnar)} 개, 열 {columnar.nbytes() / 1e6:.0f} MB, '
+      f'입력 {ingest_delta:.2f} 초')
+print(f'학생 한 명 {student_delta * 1000:.1f} ms, '
+      f'과목 하나 {subject_delta * 1000:.1f} ms, '
+      f'전체 학생 {all_delta * 1000:.0f} ms')
@@ -100,6 +100,12 @@ class PathInputData(GenericInputData):
     def read(self):
         with open(self.path) as f:
             return f.read()
+
+    # 파일 전체를 문자열로 만들지 않고, 정해진 크기의 바이트 블록으로 나눠 읽는다.
+    def read_chunks(self, chunk_size=1024 * 1024):
+        with open(self.path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
     
     @classmethod
     def generate_inputs(cls, config):
@@ -142,4 +148,590 @@ def mapreduce(worker_class, input_class, config):
 
 config = {'data_dir': tmpdir}
 result = mapreduce(LineCountWorker, PathInputData, config)
-print(f'총 {result} 줄이 있습니다.')
\ No newline at end of file
+print(f'총 {result} 줄이 있습니다.')
+
+# 입력 파일마다 스레드를 만들지 않고, 정해진 수의 프로세스에 map 단계를 나눠 맡길 수 있다.
+# 작업자는 read_chunks로 바이트 블록을 받아 줄바꿈 수를 센다.
+# 블록은 bytes일 수도, 매핑된 파일을 복사 없이 가리키는 memoryview일 수도 있다.
+# memoryview에는 count가 없지만, 블록 하나를 bytes로 복사해서 C로 구현된 count를 쓰는 편이 정규 표현식보다 훨씬 빠르다(bytes는 복사하지 않는다).
+def count_newlines(chunk):
+    return bytes(chunk).count(b'\n')
+
+class ChunkLineCountWorker(GenericWorker):
+    def map(self):
+        self.result = 0
+        for chunk in self.input_data.read_chunks():
+            self.result += count_newlines(chunk)
+
+    def reduce(self, other):
+        self.result += other.result
+
+def run_map(worker):
+    worker.map()
+    return worker
+
+# 결과가 도착하는 대로 같은 단계의 결과 두 개를 합쳐 한 단계 위로 올리는 방식으로 트리 형태로 리듀스한다.
+def push_reduce(stack, worker):
+    level = 0
+    while stack and stack[-1][0] == level:
+        _, other = stack.pop()
+        other.reduce(worker)
+        worker = other
+        level += 1
+    stack.append((level, worker))
+
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+import multiprocessing
+
+# 이 스크립트는 임포트만 해도 맨 위의 예제가 다시 실행되어 test_inputs 디렉터리를 만든다.
+# spawn 방식의 자식 프로세스는 메인 모듈을 다시 임포트하므로 os.makedirs에서 실패한다. 그래서 fork로 자식 프로세스를 만들고,
+# fork가 없는 플랫폼(Windows)에서는 같은 작업을 스레드 풀에서 실행한다.
+def make_executor(max_workers=None):
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        return ProcessPoolExecutor(max_workers, mp_context=context)
+    print('fork를 쓸 수 없어 프로세스 풀 대신 스레드 풀로 실행합니다(GIL 때문에 병렬로 실행되지 않음)')
+    return ThreadPoolExecutor(max_workers)
+
+# 한꺼번에 제출하는 작업 수를 max_pending으로 제한하므로 입력 파일이 아주 많아도 대기 중인 Future가 쌓이지 않는다.
+# mapped에는 이미 map 단계를 마친 작업자를 넘길 수 있고, on_mapped는 리듀스로 결과가 합쳐지기 전에 작업자마다 호출된다.
+# 작업자가 하나도 없으면(입력 디렉터리가 비어 있으면) 합칠 결과가 없으므로 default를 돌려준다.
+def execute_parallel(workers, max_workers=None, max_pending=1000,
+                     mapped=(), on_mapped=None, default=None):
+    workers = iter(workers)
+    stack = []
+    for worker in mapped:
+        push_reduce(stack, worker)
+    with make_executor(max_workers) as executor:
+        pending = set()
+        for worker in workers:
+            pending.add(executor.submit(run_map, worker))
+            if len(pending) >= max_pending:
+                break
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                worker = future.result()
+                if on_mapped is not None:
+                    on_mapped(worker)
+                push_reduce(stack, worker)
+                worker = next(workers, None)
+                if worker is not None:
+                    pending.add(executor.submit(run_map, worker))
+
+    if not stack:
+        return default
+    _, first = stack.pop()
+    while stack:
+        _, other = stack.pop()
+        other.reduce(first)
+        first = other
+    return first.result
+
+def mapreduce(worker_class, input_class, config):
+    workers = worker_class.create_workers(input_class, config)
+    return execute_parallel(workers, config.get('max_workers'))
+
+# 파일을 메모리에 매핑하면 파일 내용을 파이썬 객체로 복사하지 않고 바로 들여다볼 수 있다.
+# generate_inputs는 PathInputData의 것을 그대로 물려받으므로 config만으로 찾을 수 있다.
+import mmap
+from contextlib import contextmanager
+
+class MmapInputData(PathInputData):
+    # 매핑된 파일을 돌려준다. memoryview(mapped)로 복사 없이 접근할 수 있으며, 블록 안에서 만든 뷰는 블록을 나가기 전에 해제해야 한다.
+    @contextmanager
+    def mapped(self):
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b''  # 빈 파일은 매핑할 수 없다.
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                yield m
+
+    def read(self):
+        with self.mapped() as m:
+            return m[:].decode()
+
+    # 블록은 매핑을 복사 없이 가리키는 memoryview이며, 다음 블록을 요청하면 해제되므로 그 전에 다 써야 한다.
+    # 다 읽은 블록의 페이지는 운영체제에 돌려줘서, 파일이 커져도 상주 메모리가 블록 크기 정도로 유지된다.
+    def read_chunks(self, chunk_size=1024 * 1024):
+        # madvise는 페이지 경계에서만 동작하므로 블록 크기를 페이지 크기의 배수로 올린다.
+        pages = max(1, -(-chunk_size // mmap.PAGESIZE))
+        chunk_size = pages * mmap.PAGESIZE
+        with self.mapped() as m, memoryview(m) as whole:
+            for offset in range(0, len(whole), chunk_size):
+                with whole[offset:offset + chunk_size] as chunk:
+                    yield chunk
+                if hasattr(mmap, 'MADV_DONTNEED'):
+                    length = min(chunk_size, len(whole) - offset)
+                    m.madvise(mmap.MADV_DONTNEED, offset, length)
+
+# 원래의 LineCountWorker와 같은 결과가 나오는지 두 입력 클래스로 확인한다.
+expected = excute(LineCountWorker.create_workers(PathInputData, config))
+for input_class in [PathInputData, MmapInputData]:
+    result = mapreduce(ChunkLineCountWorker, input_class, config)
+    assert result == expected
+    print(f'{input_class.__name__}: 총 {result} 줄이 있습니다.')
+
+# 페이지보다 작은 블록 크기도 한 페이지로 올려서 처리한다.
+for input_data in MmapInputData.generate_inputs(config):
+    chunks = input_data.read_chunks(1000)
+    assert (sum(count_newlines(chunk) for chunk in chunks) ==
+            input_data.read().count('\n'))
+
+# 줄 수처럼 숫자 하나로 끝나지 않는 작업(단어 수 세기, 그룹별 집계)은 키가 있는 (키, 값) 레코드를 만들어야 한다.
+# map 쪽에서 같은 키의 값을 미리 합치고(컴바이너), 키를 해시해 R개의 파티션으로 나누며, 메모리 한도를 넘으면 키 순서로 정렬해 디스크에 내려 쓴다.
+import heapq
+import itertools
+import pickle
+import tempfile
+import zlib
+from operator import itemgetter
+
+# 파이썬의 hash()는 프로세스마다 달라질 수 있으므로, 모든 프로세스에서 같은 값을 내는 crc32로 파티션을 정한다.
+def partition_of(key, partitions):
+    return zlib.crc32(repr(key).encode()) % partitions
+
+class KeyedWorker(GenericWorker):
+    combine = None  # 하위 클래스가 combine(key, values)를 정의하면 map 쪽에서 값을 미리 합친다.
+
+    def __init__(self, input_data, config):
+        super().__init__(input_data)
+        self.partitions = config.get('partitions', 4)
+        self.memory_budget = config.get('memory_budget', 100_000)
+        self.spill_dir = config['spill_dir']
+
+    def map_records(self):
+        raise NotImplementedError
+
+    # 리듀서는 작업자 인스턴스 없이 파티션 단위로 실행되므로 클래스 메서드로 정의한다.
+    @classmethod
+    def reduce_values(cls, key, values):
+        raise NotImplementedError
+
+    @classmethod
+    def create_workers(cls, input_class, config):
+        workers = []
+        for input_data in input_class.generate_inputs(config):
+            workers.append(cls(input_data, config))
+        return workers
+
+    def map(self):
+        self.result = [[] for _ in range(self.partitions)]
+        buffers = [{} for _ in range(self.partitions)]
+        buffered = 0
+        for key, value in self.map_records():
+            part = buffers[partition_of(key, self.partitions)]
+            values = part.get(key)
+            if values is None:
+                part[key] = [value]
+            else:
+                values.append(value)
+                if self.combine is not None:
+                    part[key] = [self.combine(key, values)]
+                    buffered -= len(values) - 1
+            buffered += 1
+            if buffered >= self.memory_budget:
+                self.spill(buffers)
+                buffered = 0
+        self.spill(buffers)
+
+    # 파티션마다 키 순서로 정렬된 런 파일을 하나씩 만든다.
+    def spill(self, buffers):
+        for index, part in enumerate(buffers):
+            if not part:
+                continue
+            fd, path = tempfile.mkstemp(dir=self.spill_dir, suffix='.run')
+            with os.fdopen(fd, 'wb') as f:
+                for key in sorted(part):
+                    for value in part[key]:
+                        pickle.dump((key, value), f)
+            self.result[index].append(path)
+            part.clear()
+
+    # 작업자끼리 리듀스할 때는 파티션별 런 파일 목록만 합친다.
+    def reduce(self, other):
+        for runs, other_runs in zip(self.result, other.result):
+            runs.extend(other_runs)
+
+    # 한 파티션의 런 파일들을 정렬 병합하면서 같은 키끼리 모아 reduce_values를 호출한다.
+    @classmethod
+    def reduce_partition(cls, runs):
+        def read_run(path):
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        yield pickle.load(f)
+                    except EOFError:
+                        return
+
+        output = {}
+        merged = heapq.merge(*(read_run(path) for path in runs),
+                             key=itemgetter(0))
+        for key, records in itertools.groupby(merged, key=itemgetter(0)):
+            values = (value for _, value in records)
+            output[key] = cls.reduce_values(key, values)
+        for path in runs:
+            os.remove(path)
+        return output
+
+# 키가 있는 작업자는 map과 트리 리듀스로 파티션별 런 파일을 모은 다음, 파티션마다 리듀서 하나씩을 병렬로 실행한다.
+def run_keyed(worker_class, input_class, config):
+    with tempfile.TemporaryDirectory() as spill_dir:
+        config = dict(config, spill_dir=config.get('spill_dir', spill_dir))
+        workers = worker_class.create_workers(input_class, config)
+        partitions = execute_parallel(workers, config.get('max_workers'),
+                                      default=[])
+        output = {}
+        with make_executor(config.get('max_workers')) as executor:
+            for result in executor.map(worker_class.reduce_partition,
+                                       partitions):
+                output.update(result)
+        return output
+
+def mapreduce(worker_class, input_class, config):
+    if issubclass(worker_class, KeyedWorker):
+        return run_keyed(worker_class, input_class, config)
+    workers = worker_class.create_workers(input_class, config)
+    return execute_parallel(workers, config.get('max_workers'))
+
+class WordCountWorker(KeyedWorker):
+    def map_records(self):
+        for word in self.input_data.read().split():
+            yield word, 1
+
+    def combine(self, key, values):
+        return sum(values)
+
+    @classmethod
+    def reduce_values(cls, key, values):
+        return sum(values)
+
+def write_word_files(tmpdir):
+    os.makedirs(tmpdir)
+    words = ['사과', '바나나', '체리', '포도', '수박', '참외', '딸기']
+    for i in range(20):
+        with open(os.path.join(tmpdir, str(i)), 'w') as f:
+            for _ in range(random.randint(0, 1000)):
+                f.write(random.choice(words) + '\n')
+
+# 단어 파일을 만들고, Counter로 직접 센 결과와 비교한다.
+from collections import Counter
+
+word_dir = 'test_words'
+write_word_files(word_dir)
+expected = Counter()
+for input_data in PathInputData.generate_inputs({'data_dir': word_dir}):
+    expected.update(input_data.read().split())
+
+# 메모리 한도를 아주 작게 잡아 디스크로 내려 쓰는 경로도 확인한다.
+word_config = {'data_dir': word_dir, 'partitions': 3, 'memory_budget': 5}
+result = mapreduce(WordCountWorker, PathInputData, word_config)
+assert result == dict(expected)
+print(f'단어 {len(result)} 개, 총 {sum(result.values())} 번 나왔습니다.')
+
+# 입력 디렉터리가 비어 있으면 키가 있는 작업은 빈 딕셔너리를, 그렇지 않은 작업은 None을 돌려준다.
+empty_dir = 'test_empty'
+os.makedirs(empty_dir)
+assert mapreduce(WordCountWorker, PathInputData, {'data_dir': empty_dir}) == {}
+assert mapreduce(ChunkLineCountWorker, PathInputData,
+                 {'data_dir': empty_dir}) is None
+
+# 입력이 조금만 바뀌어도 전체를 다시 계산하지 않도록, 입력 파일마다 map 결과를 디스크에 캐시한다.
+# 캐시 키는 파일 경로, 크기, 수정 시각과 작업자 클래스 이름, 버전이다. 작업자의 map 로직을 바꾸면 version을 올려 예전 결과를 무효로 만든다.
+# 캐시 항목은 파일 하나씩이고, 읽을 때마다 수정 시각을 갱신해 가장 오래 쓰이지 않은 항목부터 지운다(LRU).
+import hashlib
+import time
+from contextlib import suppress
+
+def input_paths(input_data):
+    paths = getattr(input_data, 'paths', None)
+    if paths is None:
+        return [input_data.path]
+    return paths
+
+class MapResultCache:
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # 여러 파일을 묶은 입력이면 그 안의 모든 파일의 (경로, 크기, 수정 시각)이 키에 들어간다.
+    def key(self, worker):
+        files = []
+        for path in input_paths(worker.input_data):
+            stat = os.stat(path)
+            files.append((os.path.abspath(path), stat.st_size,
+                          stat.st_mtime_ns))
+        worker_class = type(worker)
+        raw = repr((files, worker_class.__module__, worker_class.__qualname__,
+                    getattr(worker_class, 'version', 0)))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    # 캐시에 결과가 있으면 (True, 결과)를, 없으면 (False, None)을 반환한다.
+    # 깨지거나 잘린 항목은 읽을 수 없으므로 지우고 없는 것으로 취급한다.
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return False, None
+        except Exception:
+            self.misses += 1
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            return False, None
+        os.utime(path)
+        self.hits += 1
+        return True, value
+
+    # 임시 파일에 다 쓴 다음 이름을 바꾸므로, 도중에 중단돼도 반쯤 쓴 항목이 남지 않는다.
+    def put(self, key, value):
+        path = self.entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(self.entry_path(name))
+            total -= size
+
+# 캐시에 결과가 있는 작업자는 map을 건너뛰고 바로 리듀스에 넣는다. 새로 계산한 결과는 리듀스로 합쳐지기 전에 캐시에 저장한다.
+def execute_cached(workers, cache, max_workers=None):
+    keys = {}
+    mapped = []
+    missing = []
+    for worker in workers:
+        key = cache.key(worker)
+        found, result = cache.get(key)
+        if found:
+            worker.result = result
+            mapped.append(worker)
+        else:
+            keys[tuple(input_paths(worker.input_data))] = key
+            missing.append(worker)
+
+    def store(worker):
+        cache.put(keys[tuple(input_paths(worker.input_data))], worker.result)
+
+    result = execute_parallel(missing, max_workers,
+                              mapped=mapped, on_mapped=store)
+    cache.evict()
+    return result
+
+# config에 cache_dir가 있으면 키가 없는 작업자는 캐시를 거쳐 실행한다.
+# 키가 있는 작업자의 map 결과는 매번 지워지는 임시 런 파일 경로이므로 캐시하지 않는다.
+def mapreduce(worker_class, input_class, config):
+    if issubclass(worker_class, KeyedWorker):
+        return run_keyed(worker_class, input_class, config)
+
+    workers = worker_class.create_workers(input_class, config)
+    if 'cache_dir' not in config:
+        return execute_parallel(workers, config.get('max_workers'))
+    cache = MapResultCache(config['cache_dir'],
+                           config.get('cache_max_bytes', 64 * 1024 * 1024))
+    return execute_cached(workers, cache, config.get('max_workers'))
+
+class CachedLineCountWorker(ChunkLineCountWorker):
+    version = 1
+
+# 캐시가 비어 있을 때와 파일 하나만 바꾼 뒤의 실행 시간을 비교한다.
+cache_config = {'data_dir': 'test_inputs', 'cache_dir': 'test_cache'}
+
+start = time.time()
+expected = mapreduce(CachedLineCountWorker, PathInputData, cache_config)
+cold_delta = time.time() - start
+
+# 파일 하나만 내용을 바꾸면 그 파일만 다시 map 한다.
+changed = os.path.join('test_inputs', os.listdir('test_inputs')[0])
+with open(changed, 'a') as f:
+    f.write('추가된 줄\n')
+start = time.time()
+cache = MapResultCache('test_cache')
+workers = CachedLineCountWorker.create_workers(PathInputData, cache_config)
+result = execute_cached(workers, cache)
+warm_delta = time.time() - start
+assert cache.misses == 1 and cache.hits == len(workers) - 1
+assert result == expected + 1
+assert result == mapreduce(ChunkLineCountWorker, PathInputData,
+                           {'data_dir': 'test_inputs'})
+print(f'처음 실행: {cold_delta:.3f} 초, 파일 하나 변경 후: {warm_delta:.3f} 초')
+
+# 깨진 항목은 없는 것으로 보고 지우며, 피클링할 수 없는 결과는 임시 파일을 남기지 않는다.
+cache = MapResultCache('test_cache')
+with open(cache.entry_path('broken'), 'wb') as f:
+    f.write(b'\x80\x05')
+assert cache.get('broken') == (False, None)
+assert not os.path.exists(cache.entry_path('broken'))
+try:
+    cache.put('lambda', lambda: None)
+except (pickle.PicklingError, AttributeError):
+    pass
+else:
+    assert False
+assert not [name for name in os.listdir('test_cache')
+            if name.endswith('.tmp')]
+
+# 캐시 크기 한도를 넘으면 가장 오래 쓰이지 않은 항목부터 지운다.
+cache = MapResultCache('test_cache', max_bytes=0)
+cache.evict()
+assert not os.listdir('test_cache')
+
+# 입력 파일이 하위 디렉터리에 수백만 개씩 흩어져 있으면 os.listdir 한 번으로는 찾을 수 없고, 작은 파일마다 작업자를 만드는 비용도 커진다.
+# 디렉터리마다 os.scandir를 스레드 풀에서 실행해 하위 디렉터리를 동시에 훑는다. scandir는 시스템 콜 동안 GIL을 놓으므로 스레드로 충분하다.
+import fnmatch
+
+def scan_dir(path, patterns):
+    files = []
+    subdirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif (entry.is_file(follow_symlinks=False) and
+                  any(fnmatch.fnmatch(entry.name, p) for p in patterns)):
+                files.append((entry.path, entry.stat().st_size))
+    return files, subdirs
+
+# 디렉터리 하나를 다 읽을 때마다 그 안의 파일을 (경로, 크기)로 내보내고 하위 디렉터리를 새 작업으로 제출한다.
+def scan_tree(root, patterns=('*',), max_workers=8):
+    with ThreadPoolExecutor(max_workers) as executor:
+        pending = {executor.submit(scan_dir, root, patterns)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                yield from files
+                for subdir in subdirs:
+                    pending.add(executor.submit(scan_dir, subdir, patterns))
+
+# 파일을 찾는 대로 순서대로 채우다가 unit_bytes를 넘기 직전에 작업 단위를 끊는다(next-fit).
+# 파일 목록을 메모리에 모으지 않지만, 마지막 단위는 작을 수 있고 단위끼리 크기가 정확히 같지는 않다.
+# unit_bytes보다 큰 파일은 혼자 작업 단위 하나가 되고, 작은 파일이 아주 많아도 max_files를 넘지 않는다.
+def pack_files(files, unit_bytes=4 * 1024 * 1024, max_files=10_000):
+    unit = []
+    unit_size = 0
+    for path, size in files:
+        if unit and (unit_size + size > unit_bytes or len(unit) >= max_files):
+            yield unit
+            unit = []
+            unit_size = 0
+        unit.append(path)
+        unit_size += size
+    if unit:
+        yield unit
+
+# 작업 단위 수를 정해 두고 크기를 고르게 나누려면 파일 목록을 모두 모은 다음,
+# 큰 파일부터 지금까지 가장 가벼운 단위에 넣는다(LPT). 가장 무거운 단위가 최적값의 4/3배를 넘지 않는다.
+def balance_files(files, units):
+    bins = [(0, index, []) for index in range(units)]
+    # 파일을 찾는 순서는 실행마다 다르므로, 같은 파일들이면 항상 같은 단위가 나오도록 경로로도 정렬한다.
+    for path, size in sorted(files, key=lambda file: (-file[1], file[0])):
+        total, index, paths = heapq.heappop(bins)
+        paths.append(path)
+        heapq.heappush(bins, (total + size, index, paths))
+    return [paths for _, _, paths in sorted(bins, key=itemgetter(1)) if paths]
+
+# 작업 단위 하나에 들어 있는 파일들을 입력 하나처럼 읽는 입력 클래스다. read_chunks를 쓰는 작업자는 그대로 사용할 수 있다.
+class FileBatchInputData(GenericInputData):
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = paths
+
+    def read(self):
+        parts = []
+        for path in self.paths:
+            with open(path) as f:
+                parts.append(f.read())
+        return ''.join(parts)
+
+    def read_chunks(self, chunk_size=1024 * 1024):
+        for path in self.paths:
+            with open(path, 'rb') as f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+
+    # config에 units가 있으면 그 수만큼 고르게 나누고, 없으면 unit_bytes 크기로 차례대로 묶는다.
+    @classmethod
+    def generate_inputs(cls, config):
+        files = scan_tree(config['data_dir'],
+                          config.get('patterns', ('*',)),
+                          config.get('scan_workers', 8))
+        if 'units' in config:
+            units = balance_files(files, config['units'])
+        else:
+            units = pack_files(files,
+                               config.get('unit_bytes', 4 * 1024 * 1024),
+                               config.get('unit_max_files', 10_000))
+        for paths in units:
+            yield cls(paths)
+
+def write_tree(root, depth=3, fanout=4, files_per_dir=50):
+    os.makedirs(root)
+    count = 0
+    for i in range(files_per_dir):
+        name = f'{i}.txt' if i % 5 else f'{i}.log'
+        with open(os.path.join(root, name), 'w') as f:
+            f.write('\n' * random.randint(0, 20))
+        count += 1
+    if depth > 0:
+        for i in range(fanout):
+            count += write_tree(os.path.join(root, f'd{i}'),
+                                depth - 1, fanout, files_per_dir)
+    return count
+
+# 세 단계 깊이의 디렉터리 트리에서 .txt 파일만 골라 줄 수를 센다.
+tree_dir = 'test_tree'
+total_files = write_tree(tree_dir)
+
+expected = 0
+for dirpath, _, names in os.walk(tree_dir):
+    for name in fnmatch.filter(names, '*.txt'):
+        with open(os.path.join(dirpath, name), 'rb') as f:
+            expected += f.read().count(b'\n')
+
+tree_config = {'data_dir': tree_dir, 'patterns': ('*.txt',),
+               'unit_bytes': 4 * 1024}
+units = list(FileBatchInputData.generate_inputs(tree_config))
+found = sum(len(unit.paths) for unit in units)
+assert found == total_files * 4 // 5
+
+result = mapreduce(ChunkLineCountWorker, FileBatchInputData, tree_config)
+assert result == expected
+print(f'파일 {found} 개를 작업 단위 {len(units)} 개로 묶어 '
+      f'총 {result} 줄을 셌습니다.')
+
+# 작업 단위 4개로 고르게 나누고, 묶은 입력의 map 결과도 캐시에 저장한다.
+balanced_config = dict(tree_config, units=4, cache_dir='test_tree_cache')
+sizes = [sum(os.path.getsize(path) for path in unit.paths)
+         for unit in FileBatchInputData.generate_inputs(balanced_config)]
+assert len(sizes) == 4 and max(sizes) - min(sizes) <= 20
+for _ in range(2):
+    result = mapreduce(ChunkLineCountWorker, FileBatchInputData,
+                       balanced_config)
+    assert result == expected
+assert len(os.listdir('test_tree_cache')) == 4
+print(f'작업 단위별 크기: {sizes}')
@@ -107,4 +107,468 @@ except subprocess.TimeoutExpired:
     proc.terminate()
     proc.wait()
 
-print('종료 상태', proc.poll())
\ No newline at end of file
+print('종료 상태', proc.poll())
+
+# data를 stdin.write 한 번으로 모두 쓰면, 자식이 출력을 내보내지 못해 멈춘 사이 파이프 버퍼가 가득 차서 교착 상태가 될 수 있다.
+# 다음 클래스는 여러 자식 프로세스를 파이프로 연결하고, 첫 프로세스의 입력과 마지막 프로세스의 출력을 논블로킹으로 조금씩 주고받는다.
+# 여러 체인의 파이프를 selectors 하나로 함께 기다리며, 동시에 실행하는 체인 수와 체인마다 걸리는 시간을 제한한다(파이프를 셀렉터에 등록할 수 있는 POSIX 전용).
+import selectors
+
+# 입력은 bytes, 바이너리 파일 객체, 바이트 블록을 내보내는 이터러블 중 하나이며, 쓸 수 있을 때마다 블록을 하나씩 꺼낸다.
+def input_chunks(data, chunk_size):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = memoryview(data)
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+    elif hasattr(data, 'read'):
+        while chunk := data.read(chunk_size):
+            yield chunk
+    else:
+        yield from data
+
+class ProcessChain:
+    def __init__(self, index, commands, data, env, chunk_size, deadline,
+                 output=None):
+        self.index = index
+        self.deadline = deadline
+        self.output = output  # None이면 출력을 메모리에 모은다.
+        self.buffer = []
+        self.procs = []
+        try:
+            for command in commands:
+                stdin = self.procs[-1].stdout if self.procs else subprocess.PIPE
+                proc = subprocess.Popen(
+                    command, env=env, stdin=stdin, stdout=subprocess.PIPE)
+                if self.procs:
+                    # 다운스트림이 죽으면 업스트림이 SIGPIPE를 받도록 부모 쪽 파이프는 닫는다.
+                    self.procs[-1].stdout.close()
+                self.procs.append(proc)
+        except BaseException:
+            # 중간 명령을 시작하지 못하면 이미 시작한 프로세스를 정리한다.
+            self.kill(None)
+            raise
+        self.stdin = self.procs[0].stdin
+        self.stdout = self.procs[-1].stdout
+        os.set_blocking(self.stdin.fileno(), False)
+        os.set_blocking(self.stdout.fileno(), False)
+        self.chunks = input_chunks(data, chunk_size)
+        self.pending = memoryview(b'')
+        self.chunk_size = chunk_size
+
+    # 파이프에 들어가는 만큼만 쓰고, 남은 부분은 다음에 쓸 수 있을 때 이어서 쓴다. 입력을 다 썼으면 True를 반환한다.
+    def write_chunk(self):
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return True
+            self.pending = memoryview(chunk)
+        try:
+            written = os.write(self.stdin.fileno(),
+                               self.pending[:self.chunk_size])
+        except BrokenPipeError:
+            return True  # 자식이 입력을 더 받지 않는다.
+        self.pending = self.pending[written:]
+        return False
+
+    def read_chunk(self):
+        chunk = os.read(self.stdout.fileno(), self.chunk_size)
+        if self.output is None:
+            self.buffer.append(chunk)
+        else:
+            self.output.write(chunk)
+        return not chunk
+
+    def close_pipes(self):
+        for proc in self.procs:
+            for pipe in (proc.stdin, proc.stdout):
+                if pipe is not None and not pipe.closed:
+                    pipe.close()
+        if self.output is not None:
+            self.output.close()
+
+    # 기다리지 않고 모든 프로세스가 끝났는지 확인한다.
+    def reaped(self):
+        return all(proc.poll() is not None for proc in self.procs)
+
+    # 모든 프로세스가 끝난 뒤에 호출한다. 출력 파일을 받았으면 닫은 그 파일 객체를, 아니면 모은 출력을 돌려준다.
+    # 셸의 pipefail처럼 마지막으로 실패한 프로세스를 알린다. 앞 프로세스는 뒤 프로세스가 먼저 죽어서 SIGPIPE로 끝났을 수 있다.
+    def finish(self):
+        self.close_pipes()
+        for proc in reversed(self.procs):
+            if proc.returncode != 0:
+                return subprocess.CalledProcessError(
+                    proc.returncode, proc.args)
+        if self.output is None:
+            return b''.join(self.buffer)
+        return self.output
+
+    def kill(self, timeout):
+        for proc in self.procs:
+            proc.kill()
+        self.close_pipes()
+        for proc in self.procs:
+            proc.wait()
+        return subprocess.TimeoutExpired(
+            [proc.args for proc in self.procs], timeout)
+
+class ProcessPipeline:
+    reap_interval = 0.01  # 출력이 끝난 체인의 종료를 확인하는 간격(초)
+
+    def __init__(self, commands, max_running=4, timeout=None,
+                 chunk_size=64 * 1024, env=None):
+        self.commands = commands
+        self.max_running = max_running
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.env = env
+
+    # 입력마다 체인의 출력을 돌려준다. 실패하거나 시간이 초과된 체인, 시작하지 못한 체인은 해당 예외 객체를 돌려준다.
+    # inputs는 체인을 새로 시작할 때마다 하나씩 꺼내므로 제너레이터여도 된다.
+    # 출력이 아주 크면 open_output(index)로 쓸 파일 객체를 만들어 넘긴다. 출력은 그 파일에 조금씩 쓰고, 체인이 끝나면 닫는다.
+    def run(self, inputs, open_output=None):
+        results = []
+        pending = iter(inputs)
+        running = set()
+        reaping = set()  # 출력은 끝났지만 아직 종료되지 않은 체인
+        selector = selectors.DefaultSelector()
+
+        def start_next():
+            for data in pending:
+                index = len(results)
+                results.append(None)
+                deadline = None
+                if self.timeout is not None:
+                    deadline = time.monotonic() + self.timeout
+                output = None if open_output is None else open_output(index)
+                try:
+                    chain = ProcessChain(index, self.commands, data, self.env,
+                                         self.chunk_size, deadline, output)
+                except Exception as e:
+                    if output is not None:
+                        output.close()
+                    results[index] = e
+                    continue
+                running.add(chain)
+                selector.register(chain.stdin, selectors.EVENT_WRITE, chain)
+                selector.register(chain.stdout, selectors.EVENT_READ, chain)
+                return
+
+        def close_stdin(chain):
+            selector.unregister(chain.stdin)
+            chain.stdin.close()
+
+        def stop(chain, finish):
+            for pipe in (chain.stdin, chain.stdout):
+                if not pipe.closed:
+                    selector.unregister(pipe)
+            results[chain.index] = finish()
+            running.discard(chain)
+            reaping.discard(chain)
+            start_next()
+
+        # 출력이 끝나도 자식 프로세스는 계속 실행 중일 수 있다. 여기서 기다리면 다른 체인과 시간 제한이 모두 멈추므로,
+        # 파이프만 닫고 running에 남겨 두었다가 종료되거나 마감 시각이 지나면 끝낸다.
+        def end_output(chain):
+            for pipe in (chain.stdin, chain.stdout):
+                if not pipe.closed:
+                    selector.unregister(pipe)
+            chain.close_pipes()
+            if chain.reaped():
+                stop(chain, chain.finish)
+            else:
+                reaping.add(chain)
+
+        try:
+            for _ in range(self.max_running):
+                start_next()
+
+            while running:
+                deadlines = [c.deadline for c in running
+                             if c.deadline is not None]
+                if reaping:
+                    deadlines.append(time.monotonic() + self.reap_interval)
+                wait = None
+                if deadlines:
+                    wait = max(0, min(deadlines) - time.monotonic())
+                for key, events in selector.select(wait):
+                    chain = key.data
+                    if chain not in running:
+                        continue  # 같은 select 결과에서 이미 끝난 체인
+                    if events & selectors.EVENT_WRITE:
+                        if chain.write_chunk():
+                            close_stdin(chain)
+                    elif chain.read_chunk():
+                        end_output(chain)
+
+                for chain in list(reaping):
+                    if chain.reaped():
+                        stop(chain, chain.finish)
+
+                now = time.monotonic()
+                for chain in list(running):
+                    if chain.deadline is not None and chain.deadline <= now:
+                        stop(chain, lambda: chain.kill(self.timeout))
+        finally:
+            # 입력 제너레이터나 출력 파일에서 예외가 나도 실행 중인 자식 프로세스를 남기지 않는다.
+            for chain in running:
+                chain.kill(self.timeout)
+            selector.close()
+        return results
+
+# 파이프 버퍼보다 훨씬 큰 데이터도 교착 상태 없이 암호화한 뒤 해시를 계산할 수 있다.
+# 입력은 한 번에 만들지 않고 1 MB 블록을 내보내는 제너레이터로 넘긴다.
+def random_chunks(count, size=1024 * 1024):
+    for _ in range(count):
+        yield os.urandom(size)
+
+env = os.environ.copy()
+env['password'] = 'zf7ShyBhZOraQDdE/FiZpm/m/8f9X+M1'
+pipeline = ProcessPipeline(
+    [['openssl', 'enc', '-des3', '-pass', 'env:password'],
+     ['openssl', 'dgst', '-whirlpool', '-binary']],
+    max_running=2, timeout=10, env=env)
+for out in pipeline.run(random_chunks(10) for _ in range(3)):
+    if isinstance(out, Exception):
+        print('실패', type(out).__name__)
+    else:
+        print(out[-10:])
+
+# 출력도 메모리에 모으지 않고 파일에 바로 쓸 수 있다.
+import tempfile
+
+with tempfile.TemporaryDirectory() as output_dir:
+    output_path = lambda index: os.path.join(output_dir, f'{index}.bin')
+    pipeline = ProcessPipeline([['cat'], ['cat']], max_running=2)
+    results = pipeline.run(
+        (random_chunks(4) for _ in range(3)),
+        open_output=lambda index: open(output_path(index), 'wb'))
+    assert all(os.path.getsize(output_path(index)) == 4 * 1024 * 1024
+               for index in range(3))
+
+# 시간이 초과된 체인은 종료시키고 TimeoutExpired를 돌려준다. 시작하지 못한 체인은 그 예외를 돌려준다.
+pipeline = ProcessPipeline([['sleep', '10'], ['cat']], timeout=0.1)
+result, = pipeline.run([b''])
+print('종료 상태', type(result).__name__)
+
+pipeline = ProcessPipeline([['cat'], ['no-such-command']])
+result, = pipeline.run([b'data'])
+print('시작 실패', type(result).__name__)
+
+# 출력을 먼저 닫고 계속 실행되는 프로세스도 시간 제한을 받는다.
+pipeline = ProcessPipeline([['sh', '-c', 'exec 1>&-; sleep 3']], timeout=0.5)
+start = time.monotonic()
+result, = pipeline.run([b''])
+assert isinstance(result, subprocess.TimeoutExpired)
+assert time.monotonic() - start < 2
+
+# 여러 프로세스가 실패하면 마지막 프로세스의 실패를 돌려준다(cat은 SIGPIPE로 끝날 수 있다).
+pipeline = ProcessPipeline([['cat'], ['false']])
+result, = pipeline.run([b'data' * 100_000])
+assert isinstance(result, subprocess.CalledProcessError)
+assert result.cmd == ['false'] and result.returncode == 1
+
+
+# 작은 작업마다 자식 프로세스를 새로 만들면 작업 자체보다 fork/exec 비용이 더 크다.
+# 오래 살아 있는 자식 프로세스를 몇 개 띄워 두고, stdin/stdout으로 '4바이트 길이 + 내용' 형식의 프레임을 주고받으며 작업을 계속 맡길 수 있다.
+import select
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from queue import Queue
+
+# 자식 프로세스에서 실행할 프로그램이다. 프레임을 하나 읽을 때마다 해시를 계산해 프레임으로 돌려준다.
+HASH_WORKER = '''
+import hashlib
+import struct
+import sys
+
+stdin = sys.stdin.buffer
+stdout = sys.stdout.buffer
+while True:
+    header = stdin.read(4)
+    if len(header) < 4:
+        break
+    data = stdin.read(struct.unpack('>I', header)[0])
+    digest = hashlib.sha256(data).digest()
+    stdout.write(struct.pack('>I', len(digest)) + digest)
+    stdout.flush()
+'''
+
+# 읽고 쓰는 파일 디스크립터가 준비될 때까지 poll로 기다린다. deadline이 지나면 TimeoutError가 발생한다.
+def wait_ready(poller, deadline):
+    timeout = None
+    if deadline is not None:
+        timeout = (deadline - time.monotonic()) * 1000
+    if (timeout is not None and timeout <= 0) or not poller.poll(timeout):
+        raise TimeoutError('자식 프로세스가 응답하지 않습니다')
+
+# 자식이 입력을 읽지 않으면 파이프 버퍼보다 큰 프레임은 영원히 다 쓸 수 없다. 논블로킹 파일 디스크립터에 들어가는 만큼씩 쓴다.
+def write_frame(fd, payload, deadline):
+    data = memoryview(struct.pack('>I', len(payload)) + payload)
+    poller = select.poll()
+    poller.register(fd, select.POLLOUT)
+    while data:
+        wait_ready(poller, deadline)
+        try:
+            written = os.write(fd, data)
+        except BlockingIOError:
+            continue
+        data = data[written:]
+
+# 응답도 파일 디스크립터에서 직접 읽고, 읽을 것이 생길 때까지 poll로 기다린다.
+def read_exact(fd, size, deadline):
+    data = bytearray()
+    poller = select.poll()
+    poller.register(fd, select.POLLIN)
+    while len(data) < size:
+        wait_ready(poller, deadline)
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            raise EOFError('자식 프로세스가 종료되었습니다')
+        data += chunk
+    return bytes(data)
+
+def read_frame(fd, deadline):
+    size, = struct.unpack('>I', read_exact(fd, 4, deadline))
+    return read_exact(fd, size, deadline)
+
+class WarmWorkerPool:
+    def __init__(self, command, size=4, retries=1, timeout=None):
+        self.command = command
+        self.size = size
+        self.retries = retries
+        self.timeout = timeout  # 작업 하나를 보내고 응답을 받기까지의 최대 시간
+        self.restarts = 0
+        self.idle = Queue()
+        self.workers = []
+        for _ in range(size):
+            self.idle.put(self.spawn())
+        self.executor = ThreadPoolExecutor(size)
+
+    def spawn(self):
+        proc = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        os.set_blocking(proc.stdin.fileno(), False)
+        self.workers.append(proc)
+        return proc
+
+    def retire(self, proc):
+        proc.kill()
+        proc.wait()
+        with suppress(OSError):
+            proc.stdin.close()
+        proc.stdout.close()
+        self.workers.remove(proc)
+        self.restarts += 1
+
+    # 쉬고 있는 자식에게 작업을 맡긴다. 자식이 죽어 있으면 새로 띄우고 작업을 다시 보낸다.
+    # 그 밖의 예외(시간 초과, 쓰다가 난 OSError 등)가 나면 프레임을 반쯤 주고받은 자식은 스트림이 어긋났으므로, 없애고 예외를 그대로 알린다.
+    # 새 자식을 띄우지 못하면 idle에 None을 돌려놓아 자리를 비워 두고, 다음 호출에서 다시 띄운다. 죽은 자식은 idle에 다시 넣지 않는다.
+    def call(self, payload):
+        proc = self.idle.get()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    if proc is None:
+                        proc = self.spawn()
+                    deadline = None
+                    if self.timeout is not None:
+                        deadline = time.monotonic() + self.timeout
+                    write_frame(proc.stdin.fileno(), payload, deadline)
+                    return read_frame(proc.stdout.fileno(), deadline)
+                except (BrokenPipeError, EOFError):
+                    self.retire(proc)
+                    proc = None
+                    if attempt == self.retries:
+                        raise
+                except BaseException:
+                    if proc is not None:
+                        self.retire(proc)
+                        proc = None
+                    raise
+        finally:
+            self.idle.put(proc)
+
+    def map(self, payloads):
+        return list(self.executor.map(self.call, payloads))
+
+    # 입력을 닫으면 자식은 스스로 끝난다. timeout 안에 끝나지 않는 자식은 강제로 종료한다.
+    def close(self):
+        self.executor.shutdown()
+        for proc in self.workers:
+            with suppress(OSError):
+                proc.stdin.close()
+        for proc in self.workers:
+            try:
+                proc.wait(self.timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+
+def run_hash_once(data):
+    result = subprocess.run(
+        ['openssl', 'dgst', '-sha256', '-binary'],
+        input=data, capture_output=True, check=True)
+    return result.stdout
+
+payloads = [os.urandom(100) for _ in range(200)]
+
+start = time.time()
+expected = [run_hash_once(data) for data in payloads]
+spawn_delta = time.time() - start
+
+pool = WarmWorkerPool([sys.executable, '-c', HASH_WORKER])
+start = time.time()
+found = pool.map(payloads)
+warm_delta = time.time() - start
+assert found == expected
+
+# 자식 하나가 죽어도 다음 작업에서 새 자식을 띄워 계속 처리한다.
+pool.workers[0].kill()
+pool.workers[0].wait()
+assert pool.map(payloads) == expected
+print(f'작업마다 프로세스 생성: 초당 {len(payloads) / spawn_delta:.0f} 개, '
+      f'상주 작업자: 초당 {len(payloads) / warm_delta:.0f} 개 '
+      f'(재시작 {pool.restarts} 번)')
+pool.close()
+
+# 응답하지 않는 자식은 timeout이 지나면 TimeoutError를 알리고 새 자식으로 바뀌므로, 호출한 쪽이 영원히 멈추지 않는다.
+pool = WarmWorkerPool(['sleep', '10'], size=1, timeout=0.2)
+start = time.time()
+try:
+    pool.call(b'data')
+except TimeoutError:
+    pass
+else:
+    assert False
+assert time.time() - start < 1 and pool.restarts == 1
+
+# 파이프 버퍼보다 큰 작업을 읽지 않는 자식에게 보내도, 쓰는 동안에도 같은 시간 제한이 적용된다.
+start = time.time()
+try:
+    pool.call(b'x' * 200_000)
+except TimeoutError:
+    pass
+else:
+    assert False
+assert time.time() - start < 1 and pool.restarts == 2
+pool.close()
+
+# 새 자식을 띄우지 못해도 풀은 망가지지 않고, 다음 호출에서 다시 띄운다.
+pool = WarmWorkerPool([sys.executable, '-c', HASH_WORKER], size=1)
+pool.workers[0].kill()
+pool.workers[0].wait()
+pool.command = ['no-such-command']
+try:
+    pool.call(payloads[0])
+except FileNotFoundError:
+    pass
+else:
+    assert False
+assert not pool.workers
+pool.command = [sys.executable, '-c', HASH_WORKER]
+assert pool.call(payloads[0]) == expected[0]
+pool.close()
+
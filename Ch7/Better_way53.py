@@ -46,6 +46,125 @@ end = time.time()
 delta = end - start
 print(f'총 {delta:.3f} 초 걸림')
 
+# 스레드 대신 알고리즘을 바꾸면 훨씬 빨라진다. 제곱근까지만 소인수분해한 다음, 소인수의 조합으로 약수를 만든다.
+from math import isqrt
+
+# 에라토스테네스의 체로 limit 이하의 소수를 구한다. 여러 수를 처리할 때는 체를 한 번만 만들어 공유한다.
+def primes_up_to(limit):
+    sieve = bytearray([1]) * (limit + 1)
+    sieve[:2] = b'\x00\x00'
+    for i in range(2, isqrt(limit) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit + 1, i)))
+    return [i for i, is_prime in enumerate(sieve) if is_prime]
+
+def prime_factors(number, primes=None):
+    if primes is None:
+        primes = primes_up_to(isqrt(number))
+    factors = {}
+    for prime in primes:
+        if prime * prime > number:
+            break
+        while number % prime == 0:
+            factors[prime] = factors.get(prime, 0) + 1
+            number //= prime
+    if number > 1:
+        factors[number] = factors.get(number, 0) + 1  # 남은 수는 소수다.
+    return factors
+
+def factorize_fast(number, primes=None):
+    if number < 1:
+        return []  # 원래의 factorize처럼 1보다 작은 수는 약수가 없다.
+    divisors = [1]
+    for prime, exponent in prime_factors(number, primes).items():
+        divisors = [divisor * prime ** power
+                    for divisor in divisors
+                    for power in range(exponent + 1)]
+    return sorted(divisors)
+
+def factorize_many(numbers):
+    primes = primes_up_to(isqrt(max(max(numbers, default=0), 0)))
+    return [factorize_fast(number, primes) for number in numbers]
+
+# 원래의 제너레이터와 결과가 같은지 확인하고 시간을 비교한다.
+start = time.time()
+expected = [list(factorize(number)) for number in numbers]
+slow_delta = time.time() - start
+
+start = time.time()
+found = factorize_many(numbers)
+fast_delta = time.time() - start
+
+assert found == expected
+assert factorize_fast(1) == [1]
+assert factorize_fast(0) == list(factorize(0)) == []
+assert factorize_fast(-5) == list(factorize(-5)) == []
+assert factorize_many([]) == []
+assert factorize_many([0, -3]) == [[], []]
+print(f'factorize: {slow_delta:.3f} 초, '
+      f'factorize_many: {fast_delta:.6f} 초')
+
+# 같은 알고리즘이라도 스레드 대신 프로세스를 쓰면 GIL에 막히지 않고 여러 코어를 쓸 수 있다.
+# 아주 큰 수는 검사할 범위를 chunksize 크기로 잘라 여러 작업자에게 나눠 주고, 끝나는 대로 결과를 돌려준다.
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+import multiprocessing
+
+# spawn 방식으로 만든 자식 프로세스는 이 스크립트를 처음부터 다시 실행하므로, 위의 느린 벤치마크까지 작업자마다 다시 돈다.
+# fork를 쓸 수 있으면 fork로 자식을 만들고, fork가 없는 플랫폼에서는 스레드 풀로 대신한다(결과는 같지만 병렬로 실행되지는 않는다).
+def make_executor(max_workers=None):
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        return ProcessPoolExecutor(max_workers, mp_context=context)
+    print('fork를 쓸 수 없어 프로세스 풀 대신 스레드 풀로 실행합니다(GIL 때문에 병렬로 실행되지 않음)')
+    return ThreadPoolExecutor(max_workers)
+
+def factorize_range(number, start, end):
+    return [i for i in range(start, end) if number % i == 0]
+
+def parallel_factorize(numbers, workers=None, chunksize=200_000):
+    with make_executor(workers) as executor:
+        futures = {}
+        pending = {}
+        for index, number in enumerate(numbers):
+            # 1보다 작은 수는 검사할 범위가 없으므로 인수 없이 바로 돌려준다.
+            if number < 1:
+                yield number, []
+                continue
+            ranges = [(start, min(start + chunksize, number + 1))
+                      for start in range(1, number + 1, chunksize)]
+            pending[index] = [len(ranges), []]
+            for start, end in ranges:
+                future = executor.submit(factorize_range, number, start, end)
+                futures[future] = index
+
+        for future in as_completed(futures):
+            index = futures[future]
+            remaining = pending[index]
+            remaining[0] -= 1
+            remaining[1].extend(future.result())
+            if remaining[0] == 0:
+                del pending[index]
+                yield numbers[index], sorted(remaining[1])
+
+# 원래의 직렬 실행과 시간을 비교하고, 결과가 factorize_fast와 같은지 확인한다.
+start = time.time()
+for number in numbers:
+    list(factorize(number))
+serial_delta = time.time() - start
+
+start = time.time()
+results = {}
+for number, factors in parallel_factorize(numbers):
+    print(f'{number}의 인수 {len(factors)} 개를 찾음')
+    results[number] = factors
+parallel_delta = time.time() - start
+
+assert all(results[n] == factorize_fast(n) for n in numbers)
+assert dict(parallel_factorize([0, -3, 12], chunksize=5)) == {
+    0: [], -3: [], 12: [1, 2, 3, 4, 6, 12]}
+print(f'직렬: {serial_delta:.3f} 초, 병렬: {parallel_delta:.3f} 초')
+
 # 직렬 포트를 통해 원격 제어 헬리콥터에 신호를 보내는 코드
 import select
 import socket
@@ -82,4 +201,217 @@ for thread in threads:
 
 end = time.time()
 delta = end - start
-print(f'총 {delta:.3f} 초 걸림')
\ No newline at end of file
+print(f'총 {delta:.3f} 초 걸림')
+
+# 호출마다 스레드를 새로 만드는 대신, 기다리는 소켓을 모두 selectors 이벤트 루프 하나에 등록하면 대기가 수천 개여도 스레드는 하나면 된다.
+# 셀렉터로 기다릴 수 없는 진짜 블로킹 호출은 크기가 정해진 스레드 풀에서 실행한다.
+import heapq
+import itertools
+import selectors
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from threading import Lock
+
+class IOExecutor:
+    def __init__(self, max_workers=8):
+        self.selector = selectors.DefaultSelector()
+        self.pool = ThreadPoolExecutor(max_workers)
+        self.lock = Lock()
+        self.requests = deque()
+        self.deadlines = []  # (마감 시각, 순번, 소켓, Future) 힙
+        self.counter = itertools.count()
+        self.closed = False
+        # 다른 스레드가 새 대기를 추가하면 이 소켓에 써서 select를 깨운다.
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ)
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # 소켓이 읽을 수 있게 되면 True, timeout이 지나면 False가 결과인 Future를 반환한다.
+    def wait_readable(self, sock, timeout):
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('닫힌 IOExecutor입니다')
+            wake = not self.requests  # 이미 깨울 예정이면 다시 깨우지 않는다.
+            self.requests.append((sock, time.monotonic() + timeout, future))
+        if wake:
+            self.wake_writer.send(b'\0')
+        return future
+
+    def submit_blocking(self, func, *args):
+        return self.pool.submit(func, *args)
+
+    def register_requests(self):
+        with self.lock:
+            requests, self.requests = self.requests, deque()
+        for sock, deadline, future in requests:
+            # 호출한 쪽이 이미 취소한 대기는 등록하지 않는다. 등록한 Future는 실행 중 상태가 되어 더는 취소할 수 없으므로, 루프에서 결과를 넣다가 실패하지 않는다.
+            if not future.set_running_or_notify_cancel():
+                continue
+            # 이미 기다리는 중인 소켓이나 닫힌 소켓이면 등록이 실패한다. 루프 스레드가 죽지 않도록 예외는 Future로 넘긴다.
+            try:
+                self.selector.register(sock, selectors.EVENT_READ, future)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            heapq.heappush(self.deadlines,
+                           (deadline, next(self.counter), sock, future))
+
+    def finish(self, sock, result):
+        future = self.selector.unregister(sock).data
+        if not future.done():
+            future.set_result(result)
+
+    def run(self):
+        while not self.closed:
+            timeout = None
+            if self.deadlines:
+                timeout = max(0, self.deadlines[0][0] - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj is self.wake_reader:
+                    try:
+                        self.wake_reader.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    self.register_requests()
+                else:
+                    self.finish(key.fileobj, True)
+
+            now = time.monotonic()
+            while self.deadlines and self.deadlines[0][0] <= now:
+                _, _, sock, future = heapq.heappop(self.deadlines)
+                # 먼저 읽을 수 있게 되어 끝난 대기의 마감 시각이면, 같은 소켓의 다음 대기를 끝내지 않도록 건너뛴다.
+                key = self.selector.get_map().get(sock)
+                if key is not None and key.data is future:
+                    self.finish(sock, False)
+
+    # 아직 끝나지 않은 대기는 모두 CancelledError로 끝내서, result()로 기다리던 쪽이 멈추지 않게 한다.
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.wake_writer.send(b'\0')
+        self.thread.join()
+        with self.lock:
+            requests, self.requests = self.requests, deque()
+        for _, _, future in requests:
+            future.cancel()
+        for key in list(self.selector.get_map().values()):
+            if key.fileobj is not self.wake_reader:
+                self.selector.unregister(key.fileobj)
+                key.data.set_exception(CancelledError())
+        self.deadlines.clear()
+        self.pool.shutdown()
+        self.selector.close()
+        self.wake_reader.close()
+        self.wake_writer.close()
+
+# 아무 데이터도 오지 않는 UDP 소켓을 0.1초 기다리는 것으로 slow_systemcall을 흉내 낸다.
+# select.select는 파일 디스크립터 번호가 큰 소켓을 다루지 못하므로 스레드 쪽은 타임아웃이 있는 recv로 기다린다.
+def blocking_wait(sock, timeout):
+    sock.settimeout(timeout)
+    try:
+        sock.recv(1)
+    except socket.timeout:
+        pass
+
+def thread_per_call(count):
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+             for _ in range(count)]
+    threads = [Thread(target=blocking_wait, args=(sock, 0.1))
+               for sock in socks]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    delta = time.time() - start
+    for sock in socks:
+        sock.close()
+    return delta
+
+def io_executor_calls(executor, count):
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+             for _ in range(count)]
+    start = time.time()
+    futures = [executor.wait_readable(sock, 0.1) for sock in socks]
+    for future in futures:
+        future.result()
+    delta = time.time() - start
+    for sock in socks:
+        sock.close()
+    return delta
+
+# 소켓 5000개를 열려면 프로세스의 파일 디스크립터 한도가 넉넉해야 한다. 소프트 한도를 하드 한도까지 올리고, 그래도 모자라면 개수를 한도에 맞춰 줄인다.
+# resource 모듈이 없는 윈도우에서는 select가 소켓을 512개까지만 기다릴 수 있다.
+try:
+    import resource
+except ImportError:
+    fd_limit = 512
+else:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 5000 + 100
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        if hard == resource.RLIM_INFINITY or hard >= wanted:
+            soft = wanted
+        else:
+            soft = hard
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    fd_limit = soft
+
+executor = IOExecutor()
+for count in [5, 500, 5000]:
+    count = min(count, fd_limit - 100)
+    thread_delta = thread_per_call(count)
+    executor_delta = io_executor_calls(executor, count)
+    print(f'{count} 개 동시 호출: '
+          f'스레드 {thread_delta:.3f} 초 ({count / thread_delta:.0f} 회/초), '
+          f'셀렉터 {executor_delta:.3f} 초 ({count / executor_delta:.0f} 회/초)')
+
+# 읽을 수 있게 되어 끝난 대기의 마감 시각이 같은 소켓의 다음 대기를 일찍 끝내지 않는다.
+# 이미 기다리는 중인 소켓을 다시 등록하면 그 Future만 실패하고 루프는 계속 돈다.
+reader, writer = socket.socketpair()
+writer.send(b'x')
+assert executor.wait_readable(reader, 0.2).result()
+reader.recv(1)
+start = time.time()
+future = executor.wait_readable(reader, 0.5)
+duplicate = executor.wait_readable(reader, 0.5)
+try:
+    duplicate.result()
+except KeyError:
+    pass
+else:
+    assert False
+assert not future.result()
+assert time.time() - start >= 0.45
+reader.close()
+writer.close()
+
+sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+future = executor.submit_blocking(blocking_wait, sock, 0.1)
+future.result()
+sock.close()
+
+# 등록되기 전에 취소한 대기는 건너뛰고, 등록된 뒤에는 취소할 수 없으므로 루프 스레드가 결과를 넣다가 죽지 않는다.
+# close는 아직 끝나지 않은 대기를 모두 CancelledError로 끝낸다.
+pairs = [socket.socketpair() for _ in range(3)]
+cancelled = executor.wait_readable(pairs[0][0], 0.1)
+cancelled.cancel()
+waiting = executor.wait_readable(pairs[1][0], 0.1)
+assert not waiting.result()
+pending = executor.wait_readable(pairs[2][0], 10)
+time.sleep(0.05)
+assert not pending.cancel()
+executor.close()
+try:
+    pending.result(timeout=1)
+except CancelledError:
+    pass
+else:
+    assert False
+assert not executor.thread.is_alive()
+for reader, writer in pairs:
+    reader.close()
+    writer.close()
@@ -77,3 +77,88 @@ for thread in threads:
 expected = how_many * 5
 found = counter.count
 print(f'카우터 값은 {expected}여야 하는데, 실제로는 {found} 입니다.')
+
+
+# 모든 스레드가 락 하나를 두고 경쟁하지 않도록, 스레드마다 자기만 쓰는 칸(샤드)을 두고 읽을 때만 합칠 수 있다.
+# 한 칸은 한 스레드만 증가시키므로 증가 경로에는 락이 필요 없다. 락은 스레드가 처음 칸을 등록할 때만 쓴다.
+import threading
+
+class ShardedCounter:
+    def __init__(self):
+        self.lock = Lock()
+        self.local = threading.local()
+        self.shards = []
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = [0]
+            with self.lock:
+                self.shards.append(shard)
+            self.local.shard = shard
+            return shard
+
+    def increment(self, offset):
+        self.shard()[0] += offset
+
+    # 여러 번의 증가를 모아서 한 번에 반영한다.
+    def increment_many(self, offsets):
+        self.shard()[0] += sum(offsets)
+
+    @property
+    def count(self):
+        with self.lock:
+            return sum(shard[0] for shard in self.shards)
+
+counter = ShardedCounter()
+
+threads = []
+for i in range(5):
+    thread = Thread(target=worker,
+                    args=(i, how_many, counter))
+    threads.append(thread)
+    thread.start()
+
+for thread in threads:
+    thread.join()
+
+expected = how_many * 5
+found = counter.count
+assert found == expected
+print(f'카우터 값은 {expected}여야 하는데, 실제로는 {found} 입니다.')
+
+def batch_worker(sensor_index, how_many, counter):
+    counter.increment_many(1 for _ in range(how_many))
+
+counter = ShardedCounter()
+threads = [Thread(target=batch_worker, args=(i, how_many, counter))
+           for i in range(5)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+assert counter.count == how_many * 5
+
+# 스레드 수를 바꿔 가며 초당 증가 횟수를 비교한다.
+import time
+
+def increments_per_second(counter_class, thread_count, how_many):
+    counter = counter_class()
+    threads = [Thread(target=worker, args=(i, how_many, counter))
+               for i in range(thread_count)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    delta = time.time() - start
+    assert counter.count == how_many * thread_count
+    return how_many * thread_count / delta
+
+for thread_count in [1, 2, 4, 8, 16, 32]:
+    locking = increments_per_second(LockingCounter, thread_count, 10**4)
+    sharded = increments_per_second(ShardedCounter, thread_count, 10**4)
+    print(f'스레드 {thread_count} 개: LockingCounter 초당 {locking:,.0f} 회, '
+          f'ShardedCounter 초당 {sharded:,.0f} 회')
@@ -10,23 +10,47 @@ def upload(item):
 
 # 가장 먼저 필요한 기능은 파이프라인의 단계마다 작업을 전달하는 방법이다.
 from collections import deque
-from threading import Lock
+from threading import Condition, Lock
 
 class MyQueue:
     def __init__(self):
         self.items = deque()
         self.lock = Lock()
+        self.not_empty = Condition(self.lock)
+        self.empty_polls = 0  # 큐가 비어 있어서 빈손으로 돌아간 get 호출 수
     
     # 생산자인 디지털 카메라는 미처리 작업을 표현하는 dequq의 끝에 새로운 이미지를 추가한다.
     def put(self, item):
         with self.lock:
             self.items.append(item)
+            self.not_empty.notify()
+
+    def put_many(self, items):
+        with self.lock:
+            self.items.extend(items)
+            self.not_empty.notify_all()
 
     # 파이프라인의 첫 번째 단계인 소비자는 미처리 작업을 표현하는 deque의 맨 앞에서 이미지를 제거한다.
-    def get(self):
+    # block=True면 원소가 들어오거나 timeout이 지날 때까지 CPU를 쓰지 않고 기다린다.
+    def get(self, block=False, timeout=None):
         with self.lock:
+            self.wait_for_items(block, timeout)
             return self.items.popleft()
 
+    def get_many(self, max_items, block=False, timeout=None):
+        with self.lock:
+            self.wait_for_items(block, timeout)
+            count = min(max_items, len(self.items))
+            return [self.items.popleft() for _ in range(count)]
+
+    # 기다린 뒤에도 비어 있으면 IndexError를 발생시켜 기존 get과 똑같이 동작한다.
+    def wait_for_items(self, block, timeout):
+        if block:
+            self.not_empty.wait_for(lambda: self.items, timeout)
+        if not self.items:
+            self.empty_polls += 1
+            raise IndexError('빈 큐에서 가져오려고 했습니다')
+
 # 다음 코드는 큐에서 가져온 작업에 함수를 적용하고, 그 결과를 다른 큐에 넣는 스레드를 통해 파이프라인의 각 단계를 구현한다.
 # 그리고 각 작업자가 얼마나 많은이 새로운 입력을 검사했고 얼마나 많이 작업을 완료했는지 추적한다.
 from threading import Thread
@@ -89,6 +113,84 @@ polled = sum(t.polled_count for t in threads)
 print(f'{processed} 개의 아이템을 처리했습니다,'
     f'이때 풀링을 {polled} 번 했습니다.')
 
+# 블로킹 get을 쓰면 작업자는 원소가 올 때까지 잠들어 있으므로 폴링하느라 CPU를 낭비하지 않는다.
+# timeout은 작업자가 종료 신호(in_queue = None)를 확인하는 주기일 뿐이다.
+class BlockingWorker(Worker):
+    def __init__(self, func, in_queue, out_queue, batch_size=100):
+        super().__init__(func, in_queue, out_queue)
+        self.batch_size = batch_size
+
+    def run(self):
+        while True:
+            self.polled_count += 1
+            try:
+                items = self.in_queue.get_many(
+                    self.batch_size, block=True, timeout=0.1)
+            except IndexError:
+                continue
+            except AttributeError:
+                return
+            else:
+                results = [self.func(item) for item in items]
+                self.out_queue.put_many(results)
+                self.work_done += len(items)
+
+download_queue = MyQueue()
+resize_queue = MyQueue()
+upload_queue = MyQueue()
+
+done_queue = MyQueue()
+threads = [
+    BlockingWorker(download, download_queue, resize_queue),
+    BlockingWorker(resize, resize_queue, upload_queue),
+    BlockingWorker(upload, upload_queue, done_queue),
+]
+
+for thread in threads:
+    thread.start()
+
+download_queue.put_many(object() for _ in range(1000))
+
+for _ in range(1000):
+    done_queue.get(block=True)
+
+for thread in threads:
+    thread.in_queue = None
+    thread.join()
+
+polled = sum(t.polled_count for t in threads)
+empty = sum(q.empty_polls
+            for q in [download_queue, resize_queue, upload_queue])
+print(f'1000 개의 아이템을 처리했습니다,'
+    f'이때 풀링을 {polled} 번, 빈 큐 확인을 {empty} 번 했습니다.')
+
+# 넣은 원소가 다음 단계에 전달되기까지 걸리는 시간을 재서 폴링 방식과 비교한다.
+def handoff_latency(worker_class):
+    in_queue = MyQueue()
+    out_queue = MyQueue()
+    thread = worker_class(lambda item: item, in_queue, out_queue)
+    thread.start()
+    latencies = []
+    for _ in range(100):
+        start = time.perf_counter()
+        in_queue.put(start)
+        while True:
+            try:
+                out_queue.get(block=True, timeout=1)
+            except IndexError:
+                continue
+            break
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.001)  # 작업자가 다시 기다리는 상태가 되도록 한다.
+    thread.in_queue = None
+    thread.join()
+    return sum(latencies) / len(latencies)
+
+polling = handoff_latency(Worker)
+blocking = handoff_latency(BlockingWorker)
+print(f'평균 전달 지연 시간: 폴링 {polling * 1000:.3f} ms, '
+      f'블로킹 {blocking * 1000:.3f} ms')
+
 # queue를 이용해 앞에 있는 문제들을 해결할 수 있다.
 from queue import Queue
 
@@ -246,4 +348,880 @@ stop_threads(download_queue, download_threads)
 stop_threads(resize_queue, resize_threads)
 stop_threads(upload_queue, upload_threads)
 
-print(done_queue.qsize(), '개의 원소가 처리됨')
\ No newline at end of file
+print(done_queue.qsize(), '개의 원소가 처리됨')
+
+# 원소를 하나씩 주고받으면 원소마다 락을 잡고 task_done을 호출해야 한다.
+# 한 번에 최대 max_items 개를 꺼내되 첫 원소가 온 뒤로는 최대 max_wait 초까지만 더 기다리면, 락과 task_done 비용을 묶음 단위로 줄일 수 있다.
+class BatchingQueue(ClosableQueue):
+    def put_many(self, items):
+        with self.not_full:
+            for item in items:
+                while 0 < self.maxsize <= self._qsize():
+                    self.not_full.wait()
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+
+    def get_many(self, max_items, max_wait):
+        items = []
+        with self.not_empty:
+            while not self._qsize():
+                self.not_empty.wait()
+            deadline = time.monotonic() + max_wait
+            while len(items) < max_items:
+                if not self._qsize():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.not_empty.wait(remaining)
+                    continue
+                item = self._get()
+                items.append(item)
+                if item is self.SENTINAL:
+                    break  # 센티넬 뒤의 원소는 다른 작업자의 몫이다.
+            self.not_full.notify(len(items))
+        return items
+
+    def task_done_many(self, count):
+        with self.all_tasks_done:
+            unfinished = self.unfinished_tasks - count
+            if unfinished < 0:
+                raise ValueError('task_done_many() called too many times')
+            if unfinished == 0:
+                self.all_tasks_done.notify_all()
+            self.unfinished_tasks = unfinished
+
+    # __iter__와 마찬가지로 센티넬을 만나면 남은 묶음을 넘겨준 뒤 이터레이션을 끝낸다.
+    def iter_batches(self, max_items, max_wait):
+        while True:
+            batch = self.get_many(max_items, max_wait)
+            closed = batch[-1] is self.SENTINAL
+            if closed:
+                batch.pop()
+            try:
+                if batch:
+                    yield batch
+            finally:
+                self.task_done_many(len(batch) + closed)
+            if closed:
+                return
+
+# 묶음 단위 작업자는 func에 리스트를 넘기고, 결과 리스트를 다음 큐에 한꺼번에 넣는다.
+class BatchingWorker(StoppableWorker):
+    def __init__(self, func, in_queue, out_queue,
+                 batch_size=100, max_wait=0.01):
+        super().__init__(func, in_queue, out_queue)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+
+    def run(self):
+        batches = self.in_queue.iter_batches(self.batch_size, self.max_wait)
+        for batch in batches:
+            self.out_queue.put_many(self.func(batch))
+
+def download_batch(items):
+    return [download(item) for item in items]
+
+def resize_batch(items):
+    return [resize(item) for item in items]
+
+def upload_batch(items):
+    return [upload(item) for item in items]
+
+def run_pipeline(worker_class, queue_class, stages, item_count):
+    queues = [queue_class() for _ in range(len(stages) + 1)]
+    stage_threads = []
+    for (count, func), in_queue, out_queue in zip(
+            stages, queues, queues[1:]):
+        threads = [worker_class(func, in_queue, out_queue)
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        stage_threads.append(threads)
+
+    start = time.time()
+    items = (object() for _ in range(item_count))
+    if isinstance(queues[0], BatchingQueue):
+        queues[0].put_many(items)
+    else:
+        for item in items:
+            queues[0].put(item)
+    for queue, threads in zip(queues, stage_threads):
+        stop_threads(queue, threads)
+    delta = time.time() - start
+
+    assert queues[-1].qsize() == item_count
+    return delta
+
+item_count = 20000
+single = run_pipeline(
+    StoppableWorker, ClosableQueue,
+    [(3, download), (4, resize), (5, upload)], item_count)
+batched = run_pipeline(
+    BatchingWorker, BatchingQueue,
+    [(3, download_batch), (4, resize_batch), (5, upload_batch)], item_count)
+print(f'{item_count} 개 처리: 원소 단위 {single:.3f} 초, '
+      f'묶음 단위 {batched:.3f} 초 ({single / batched:.1f} 배)')
+
+
+# 단계마다 작업자 수를 고정하는 대신, 감독 스레드가 큐 길이와 처리량을 보고 가장 느린 단계에 작업자를 더 붙이게 할 수 있다.
+# 작업자는 처리한 원소 수와 func 실행에 쓴 시간을 기록한다.
+import threading
+
+class MeteredWorker(StoppableWorker):
+    def __init__(self, func, in_queue, out_queue):
+        super().__init__(func, in_queue, out_queue)
+        self.processed = 0
+        self.busy_time = 0
+
+    def run(self):
+        for item in self.in_queue:
+            start = time.perf_counter()
+            result = self.func(item)
+            self.busy_time += time.perf_counter() - start
+            self.processed += 1
+            self.out_queue.put(result)
+
+# 작업자를 줄일 때는 센티넬을 하나 넣는다. 어느 작업자든 그 센티넬을 받은 하나만 종료한다.
+class PipelineStage:
+    def __init__(self, name, func, in_queue, out_queue,
+                 min_workers=1, max_workers=8):
+        self.name = name
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.threads = []
+        self.workers = 0  # 아직 센티넬을 받지 않을 작업자 수
+        self.last_sample = (time.perf_counter(), 0, 0)
+        for _ in range(min_workers):
+            self.grow()
+
+    def grow(self):
+        thread = MeteredWorker(self.func, self.in_queue, self.out_queue)
+        thread.start()
+        self.threads.append(thread)
+        self.workers += 1
+
+    def shrink(self):
+        self.in_queue.close()
+        self.workers -= 1
+
+    def sample(self):
+        now = time.perf_counter()
+        processed = sum(t.processed for t in self.threads)
+        busy_time = sum(t.busy_time for t in self.threads)
+        last_time, last_processed, last_busy_time = self.last_sample
+        self.last_sample = (now, processed, busy_time)
+        elapsed = now - last_time
+        return {
+            'workers': self.workers,
+            'queue_depth': self.in_queue.qsize(),
+            'items_per_sec': (processed - last_processed) / elapsed,
+            'busy_ratio': (busy_time - last_busy_time) / (
+                elapsed * max(1, self.workers)),
+        }
+
+    def stop(self):
+        for _ in range(self.workers):
+            self.in_queue.close()
+        self.in_queue.join()
+        for thread in self.threads:
+            thread.join()
+
+class PipelineSupervisor(Thread):
+    def __init__(self, stages, interval=0.05, scale_up_depth=10,
+                 scale_up_busy=0.8, scale_down_busy=0.3):
+        super().__init__(daemon=True)
+        self.stages = stages
+        self.interval = interval
+        self.scale_up_depth = scale_up_depth
+        self.scale_up_busy = scale_up_busy
+        self.scale_down_busy = scale_down_busy
+        self.metrics = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for stage in self.stages:
+                metrics = stage.sample()
+                self.metrics[stage.name] = metrics
+                self.scale(stage, metrics)
+
+    def scale(self, stage, metrics):
+        if (metrics['queue_depth'] > self.scale_up_depth and
+                metrics['busy_ratio'] > self.scale_up_busy and
+                stage.workers < stage.max_workers):
+            stage.grow()
+        elif (metrics['queue_depth'] == 0 and
+                metrics['busy_ratio'] < self.scale_down_busy and
+                stage.workers > stage.min_workers):
+            stage.shrink()
+
+    # 감독을 먼저 멈춘 다음, 앞 단계부터 차례로 종료한다.
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        for stage in self.stages:
+            stage.stop()
+
+# 단계별 비용을 일부러 다르게 해서, 작업자 수가 고정된 경우와 자동으로 조절되는 경우를 비교한다.
+def slow_download(item):
+    time.sleep(0.001)
+    return item
+
+def slow_resize(item):
+    time.sleep(0.005)
+    return item
+
+def slow_upload(item):
+    time.sleep(0.001)
+    return item
+
+def run_supervised(item_count, max_workers):
+    download_queue = ClosableQueue()
+    resize_queue = ClosableQueue()
+    upload_queue = ClosableQueue()
+    done_queue = ClosableQueue()
+    stages = [
+        PipelineStage('download', slow_download, download_queue,
+                      resize_queue, max_workers=max_workers),
+        PipelineStage('resize', slow_resize, resize_queue,
+                      upload_queue, max_workers=max_workers),
+        PipelineStage('upload', slow_upload, upload_queue,
+                      done_queue, max_workers=max_workers),
+    ]
+    supervisor = PipelineSupervisor(stages)
+    supervisor.start()
+
+    start = time.time()
+    for _ in range(item_count):
+        download_queue.put(object())
+    while done_queue.qsize() < item_count:
+        time.sleep(0.01)
+    delta = time.time() - start
+
+    metrics = dict(supervisor.metrics)
+    started_workers = {stage.name: len(stage.threads) for stage in stages}
+    supervisor.stop()
+    return delta, metrics, started_workers
+
+fixed_delta, _, _ = run_supervised(500, max_workers=1)
+scaled_delta, metrics, started_workers = run_supervised(500, max_workers=8)
+print(f'500 개 처리: 작업자 고정 {fixed_delta:.3f} 초, '
+      f'자동 조절 {scaled_delta:.3f} 초')
+for name, stage_metrics in metrics.items():
+    print(f'{name}: 시작한 작업자 {started_workers[name]} 개, '
+          f'큐 길이 {stage_metrics["queue_depth"]}, '
+          f'초당 {stage_metrics["items_per_sec"]:.0f} 개, '
+          f'바쁜 비율 {stage_metrics["busy_ratio"]:.2f}')
+
+
+# 같은 세 단계 파이프라인을 asyncio로 만들면 동시에 진행하는 다운로드가 수천 개여도 스레드를 수천 개 만들 필요가 없다.
+# ClosableQueue와 똑같이 센티넬로 입력의 끝을 알린다.
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# 이 파일은 임포트될 때 앞의 스레드 예제를 모두 실행하므로, 스크립트를 다시 임포트하는 spawn 방식의 자식 프로세스는 쓸 수 없다.
+# fork가 있으면 fork 컨텍스트로 프로세스 풀을 만들고, 없으면(Windows) 스레드 풀로 대신한다.
+def make_executor(max_workers=None):
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        return ProcessPoolExecutor(max_workers, mp_context=context)
+    print('fork를 쓸 수 없어 프로세스 풀 대신 스레드 풀로 실행합니다(GIL 때문에 병렬로 실행되지 않음)')
+    return ThreadPoolExecutor(max_workers)
+
+class AsyncClosableQueue(asyncio.Queue):
+    SENTINAL = object()
+
+    async def close(self):
+        await self.put(self.SENTINAL)
+
+    async def __aiter__(self):
+        while True:
+            item = await self.get()
+            try:
+                if item is self.SENTINAL:
+                    return
+                yield item
+            finally:
+                self.task_done()
+
+async def stop_tasks(closable_queue, tasks):
+    for _ in tasks:
+        await closable_queue.close()
+
+    await closable_queue.join()
+    await asyncio.gather(*tasks)
+
+# 단계는 (func, 동시 실행 수, 실행기)로 지정한다. 코루틴이 아닌 func는 실행기에서 실행하므로, CPU를 많이 쓰는 단계는 프로세스 풀로 넘길 수 있다.
+class AsyncPipeline:
+    def __init__(self, stages, maxsize=1000):
+        self.stages = stages
+        self.maxsize = maxsize  # 단계 사이에 쌓일 수 있는 원소 수(배압)
+
+    async def call(self, func, executor, item):
+        if asyncio.iscoroutinefunction(func):
+            return await func(item)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, item)
+
+    async def stage_worker(self, func, executor, in_queue, out_queue):
+        async for item in in_queue:
+            result = await self.call(func, executor, item)
+            await out_queue.put(result)
+
+    async def feed(self, items, queues, stage_tasks):
+        for item in items:
+            await queues[0].put(item)  # 큐가 가득 차면 여기서 기다린다.
+
+        for queue, tasks in zip(queues, stage_tasks):
+            await stop_tasks(queue, tasks)
+
+    # 단계 하나가 예외로 끝나면 그 단계의 큐는 더 비워지지 않으므로 feed가 영원히 기다린다.
+    # 입력을 넣는 태스크와 모든 단계의 태스크를 함께 지켜보다가 처음 난 예외에서 나머지를 취소하고 예외를 다시 일으킨다.
+    async def run(self, items):
+        queues = [AsyncClosableQueue(self.maxsize) for _ in self.stages]
+        done_queue = AsyncClosableQueue()
+        stage_tasks = []
+        for (func, concurrency, executor), in_queue, out_queue in zip(
+                self.stages, queues, queues[1:] + [done_queue]):
+            tasks = [asyncio.create_task(
+                         self.stage_worker(func, executor, in_queue, out_queue))
+                     for _ in range(concurrency)]
+            stage_tasks.append(tasks)
+
+        feeder = asyncio.create_task(self.feed(items, queues, stage_tasks))
+        all_tasks = [feeder] + [task for tasks in stage_tasks for task in tasks]
+        try:
+            done, _ = await asyncio.wait(
+                all_tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in all_tasks:
+                task.cancel()
+            await asyncio.gather(*all_tasks, return_exceptions=True)
+
+        results = []
+        while not done_queue.empty():
+            results.append(done_queue.get_nowait())
+        return results
+
+async def download_async(item):
+    await asyncio.sleep(0.01)  # 네트워크 대기
+    return item
+
+async def upload_async(item):
+    await asyncio.sleep(0.01)
+    return item
+
+# 파이프라인이 도는 동안 스레드 수를 재서 가장 많았던 값을 함께 돌려준다.
+async def run_counting_threads(pipeline, items):
+    task = asyncio.create_task(pipeline.run(items))
+    peak = threading.active_count()
+    while not task.done():
+        peak = max(peak, threading.active_count())
+        await asyncio.sleep(0.01)
+    return await task, peak
+
+# 원소 2만 개를 처리해도 스레드 수는 늘지 않는다.
+item_count = 20_000
+with make_executor() as executor:
+    pipeline = AsyncPipeline([
+        (download_async, 2000, None),
+        (resize, 8, executor),
+        (upload_async, 2000, None),
+    ])
+    start = time.time()
+    results, peak_threads = asyncio.run(
+        run_counting_threads(pipeline, range(item_count)))
+    delta = time.time() - start
+
+assert sorted(results) == list(range(item_count))
+print(f'{item_count} 개 처리: {delta:.3f} 초 '
+      f'(실행 중 스레드 최대 {peak_threads} 개)')
+
+# 한 단계에서 예외가 나면 파이프라인이 멈추지 않고 그 예외를 알린다.
+async def fail_on_13(item):
+    if item == 13:
+        raise ValueError('13은 처리할 수 없습니다')
+    return item
+
+pipeline = AsyncPipeline([(download_async, 10, None), (fail_on_13, 2, None)],
+                         maxsize=5)
+try:
+    asyncio.run(asyncio.wait_for(pipeline.run(range(1000)), 5))
+except ValueError:
+    pass
+else:
+    assert False
+
+
+# CPU를 많이 쓰는 resize 단계만 프로세스 풀에서 실행하고, 다운로드와 업로드는 그대로 스레드로 둘 수 있다.
+# 큰 이미지 바이트를 피클링해서 주고받지 않도록, 미리 만든 공유 메모리 슬롯에 입력을 쓰고 결과도 같은 슬롯으로 돌려받는다.
+import os
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from queue import Queue
+
+attached_slots = {}  # 자식 프로세스마다 슬롯에 한 번씩만 연결한다.
+
+# bytes()는 정수를 받으면 그 길이의 0 바이트를 만들므로, 바이트열이 아닌 결과는 조용히 바꾸지 않고 거부한다.
+def as_bytes(result):
+    if not isinstance(result, (bytes, bytearray, memoryview)):
+        raise TypeError(
+            f'func는 바이트열을 반환해야 합니다: {type(result).__name__}')
+    return bytes(result)
+
+def run_in_slot(func, name, size):
+    shm = attached_slots.get(name)
+    if shm is None:
+        shm = attached_slots[name] = shared_memory.SharedMemory(name=name)
+    view = shm.buf[:size]
+    try:
+        result = as_bytes(func(view))
+    finally:
+        view.release()
+    if len(result) > len(shm.buf):
+        return result  # 슬롯보다 큰 결과는 피클링해서 그대로 돌려준다.
+    shm.buf[:len(result)] = result
+    return len(result)
+
+def run_pickled(func, item):
+    return as_bytes(func(item))
+
+# StoppableWorker 자리에 그대로 넣을 수 있다. 슬롯 수만큼만 동시에 처리하므로 메모리 사용량도 일정하다.
+# out_queue에는 결과 바이트열만 들어간다. 실패한 원소의 예외는 errors에 모으므로, 뒤 단계는 받은 원소를 그대로 처리하면 된다.
+class ProcessStage(Thread):
+    def __init__(self, func, in_queue, out_queue,
+                 workers=None, slots=8, slot_size=1 << 20):
+        super().__init__()
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.workers = workers
+        self.slots = slots
+        self.slot_size = slot_size
+        self.errors = []
+
+    def run(self):
+        buffers = [shared_memory.SharedMemory(create=True, size=self.slot_size)
+                   for _ in range(self.slots)]
+        free_slots = Queue()
+        for shm in buffers:
+            free_slots.put(shm)
+
+        def on_done(shm, future):
+            try:
+                result = future.result()
+                if isinstance(result, int):
+                    result = bytes(shm.buf[:result])
+            except Exception as e:
+                self.errors.append(e)
+                return
+            finally:
+                if shm is not None:
+                    free_slots.put(shm)  # 실패해도 슬롯은 돌려놓아야 멈추지 않는다.
+            self.out_queue.put(result)
+
+        def start(executor, item):
+            shm = None
+            try:
+                if len(item) > self.slot_size:
+                    # 슬롯에 들어가지 않는 큰 원소는 공유 메모리 대신 피클링해서 넘긴다.
+                    future = executor.submit(run_pickled, self.func, item)
+                else:
+                    shm = free_slots.get()  # 처리 중인 슬롯이 모두 차 있으면 기다린다.
+                    shm.buf[:len(item)] = item
+                    future = executor.submit(
+                        run_in_slot, self.func, shm.name, len(item))
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda future: on_done(shm, future))
+
+        try:
+            with make_executor(self.workers) as executor:
+                for item in self.in_queue:
+                    start(executor, item)
+        finally:
+            for shm in buffers:
+                shm.close()
+                shm.unlink()
+
+def download_image(item):
+    return os.urandom(256 * 1024)
+
+def resize_image(data):
+    # 가로세로를 절반으로 줄인다고 가정하고, 네 바이트 중 하나만 남긴다.
+    return bytes(data[::4])
+
+def upload_image(item):
+    return len(item)
+
+def run_image_pipeline(resize_stage_class, item_count):
+    download_queue = ClosableQueue()
+    resize_queue = ClosableQueue()
+    upload_queue = ClosableQueue()
+    done_queue = ClosableQueue()
+
+    download_threads = start_threads(
+        3, download_image, download_queue, resize_queue)
+    resize_threads = [
+        resize_stage_class(resize_image, resize_queue, upload_queue)]
+    for thread in resize_threads:
+        thread.start()
+    upload_threads = start_threads(
+        5, upload_image, upload_queue, done_queue)
+
+    start = time.time()
+    for _ in range(item_count):
+        download_queue.put(object())
+
+    stop_threads(download_queue, download_threads)
+    stop_threads(resize_queue, resize_threads)
+    stop_threads(upload_queue, upload_threads)
+    delta = time.time() - start
+
+    sizes = [done_queue.get() for _ in range(item_count)]
+    assert sizes == [64 * 1024] * item_count
+    return delta
+
+threaded = run_image_pipeline(StoppableWorker, 200)
+processed = run_image_pipeline(ProcessStage, 200)
+print(f'resize 스레드: {threaded:.3f} 초, '
+      f'resize 프로세스 풀: {processed:.3f} 초')
+
+# 슬롯보다 큰 입력이나 결과는 피클링해서 주고받는다. func가 실패하거나 바이트열이 아닌 값을 반환한 원소는 errors에 모인다.
+def repeat_or_fail(data):
+    if len(data) == 0:
+        raise ValueError('빈 이미지')
+    if data[:1] == b'?':
+        return len(data)
+    return bytes(data) * 2
+
+in_queue = ClosableQueue()
+out_queue = ClosableQueue()
+stage = ProcessStage(repeat_or_fail, in_queue, out_queue, slot_size=4096)
+stage.start()
+items = [b'a' * 100, b'b' * 3000, b'c' * 10_000, b'', b'?' * 100]
+for item in items:
+    in_queue.put(item)
+stop_threads(in_queue, [stage])
+
+assert sorted(type(e).__name__ for e in stage.errors) == [
+    'TypeError', 'ValueError']
+outputs = [out_queue.get() for _ in range(len(items) - len(stage.errors))]
+assert out_queue.empty()
+assert sorted(outputs) == sorted(item * 2 for item in items[:3])
+
+
+# 파이프라인의 각 단계가 얼마나 걸리는지 보려면 큐와 작업자 함수에 계측을 끼워 넣을 수 있다.
+# 히스토그램은 HDR 히스토그램처럼 2의 거듭제곱 구간을 16개씩 나눈 고정 크기 버킷을 쓰므로, 원소가 아무리 많아도 메모리가 늘지 않는다(오차 약 6%).
+import io
+import itertools
+import json
+from collections import defaultdict
+
+class LatencyHistogram:
+    SUB_BUCKETS = 16
+
+    def __init__(self, max_bits=48):
+        self.counts = [0] * ((max_bits + 1) * self.SUB_BUCKETS)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.lock = Lock()
+
+    def bucket(self, value):
+        if value < 2 * self.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - 5
+        return shift * self.SUB_BUCKETS + (value >> shift)
+
+    def bucket_floor(self, index):
+        if index < 2 * self.SUB_BUCKETS:
+            return index
+        shift = index // self.SUB_BUCKETS - 1
+        return (index % self.SUB_BUCKETS + self.SUB_BUCKETS) << shift
+
+    def record(self, value):
+        index = min(self.bucket(value), len(self.counts) - 1)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, percent):
+        target = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return self.bucket_floor(index)
+        return 0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_us': round(self.total / max(1, self.count) / 1000, 3),
+            'p50_us': self.percentile(50) / 1000,
+            'p90_us': self.percentile(90) / 1000,
+            'p99_us': self.percentile(99) / 1000,
+            'max_us': self.max / 1000,
+        }
+
+# 추적기는 단계별 처리 시간, 단계 앞 큐의 대기 시간, 전체 지연 시간 히스토그램을 모으고 JSON 줄로 내보낸다.
+# 원소마다 시각을 재면 큐 연산보다 계측이 더 비싸지므로, 파이프라인에 들어오는 원소 중 sample_every 개마다 하나만 TracedItem으로 감싸 추적한다.
+# 나머지 원소는 감싸지 않고 그대로 흘려보내므로 큐는 바꿀 필요가 없고, 추적하지 않는 원소에는 타입 검사 한 번만 더해진다.
+class TracedItem:
+    __slots__ = ('item', 'origin', 'enqueued')
+
+    def __init__(self, item, origin, enqueued):
+        self.item = item
+        self.origin = origin  # 파이프라인에 들어온 시각
+        self.enqueued = enqueued  # 다음 큐에 들어간 시각
+
+class PipelineTracer:
+    def __init__(self, sample_every=64):
+        self.sample_every = sample_every
+        self.service = defaultdict(LatencyHistogram)
+        self.queue_wait = defaultdict(LatencyHistogram)
+        self.end_to_end = LatencyHistogram()
+
+    # 첫 번째 큐에 넣을 원소들을 이 제너레이터로 감싼다. 추적하지 않는 원소는 islice로 그대로 넘긴다.
+    def sample(self, items):
+        items = iter(items)
+        end = object()
+        while True:
+            yield from itertools.islice(items, self.sample_every - 1)
+            item = next(items, end)
+            if item is end:
+                return
+            now = time.perf_counter_ns()
+            yield TracedItem(item, now, now)
+
+    # 큐와 작업자 종류에 상관없이 func만 감싸면 되므로 Worker/MyQueue 파이프라인도 StoppableWorker/ClosableQueue 파이프라인처럼 계측할 수 있다.
+    # 모든 단계의 func를 감싸야 하며, 마지막 단계는 final=True로 감싸서 원래 결과를 내보내고 전체 지연 시간을 기록한다.
+    def trace_func(self, stage, func, final=False):
+        service = self.service[stage]
+        wait = self.queue_wait[stage]
+        end_to_end = self.end_to_end
+        traced_item = TracedItem
+        def traced(item):
+            if type(item) is not traced_item:
+                return func(item)  # 추적하지 않는 원소
+            start = time.perf_counter_ns()
+            wait.record(start - item.enqueued)
+            result = func(item.item)
+            end = time.perf_counter_ns()
+            service.record(end - start)
+            if final:
+                end_to_end.record(end - item.origin)
+                return result
+            return TracedItem(result, item.origin, end)
+        return traced
+
+    def export(self, out):
+        records = [('service', name, h) for name, h in self.service.items()]
+        records += [('queue_wait', name, h)
+                    for name, h in self.queue_wait.items()]
+        records.append(('end_to_end', 'pipeline', self.end_to_end))
+        for metric, name, histogram in records:
+            if not histogram.count:
+                continue
+            record = {'metric': metric, 'name': name}
+            record.update(histogram.summary())
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def run_traced_pipeline(tracer, item_count):
+    if tracer:
+        wrap = tracer.trace_func
+        items = tracer.sample(object() for _ in range(item_count))
+    else:
+        wrap = lambda stage, func, final=False: func
+        items = (object() for _ in range(item_count))
+
+    download_queue = ClosableQueue()
+    resize_queue = ClosableQueue()
+    upload_queue = ClosableQueue()
+    done_queue = ClosableQueue()
+    download_threads = start_threads(
+        3, wrap('download', download), download_queue, resize_queue)
+    resize_threads = start_threads(
+        4, wrap('resize', resize), resize_queue, upload_queue)
+    upload_threads = start_threads(
+        5, wrap('upload', upload, final=True), upload_queue, done_queue)
+
+    start = time.perf_counter()
+    for item in items:
+        download_queue.put(item)
+    stop_threads(download_queue, download_threads)
+    stop_threads(resize_queue, resize_threads)
+    stop_threads(upload_queue, upload_threads)
+    delta = time.perf_counter() - start
+    assert done_queue.qsize() == item_count
+    assert not any(type(item) is TracedItem for item in done_queue.queue)
+    return delta
+
+plain = min(run_traced_pipeline(None, 20000) for _ in range(5))
+tracer = PipelineTracer()
+traced = min(run_traced_pipeline(tracer, 20000) for _ in range(5))
+
+output = io.StringIO()
+tracer.export(output)
+print(output.getvalue(), end='')
+print(f'계측 없음: {plain:.3f} 초, 계측: {traced:.3f} 초 '
+      f'(오버헤드 {(traced / plain - 1) * 100:.1f}%)')
+
+# 폴링하는 Worker와 MyQueue로 만든 파이프라인도 func만 감싸면 똑같이 계측된다.
+tracer = PipelineTracer(sample_every=10)
+download_queue = MyQueue()
+resize_queue = MyQueue()
+upload_queue = MyQueue()
+done_queue = MyQueue()
+threads = [
+    BlockingWorker(tracer.trace_func('download', download),
+                   download_queue, resize_queue),
+    BlockingWorker(tracer.trace_func('resize', resize),
+                   resize_queue, upload_queue),
+    BlockingWorker(tracer.trace_func('upload', upload, final=True),
+                   upload_queue, done_queue),
+]
+for thread in threads:
+    thread.start()
+download_queue.put_many(tracer.sample(object() for _ in range(1000)))
+while len(done_queue.items) < 1000:
+    time.sleep(0.01)
+for thread in threads:
+    thread.in_queue = None
+    thread.join()
+assert tracer.end_to_end.count == 100
+assert all(tracer.service[name].count == 100
+           for name in ['download', 'resize', 'upload'])
+
+
+# 단계 사이에 생산자와 소비자가 정확히 하나씩이라면, 미리 할당한 고정 크기 리스트를 원형 버퍼로 쓰는 큐로 충분하다.
+# 생산자만 tail을, 소비자만 head를 바꾸므로 원소를 주고받을 때는 락이 필요 없다. 큐가 비었거나 가득 찼을 때만 Event로 잠든다.
+from threading import Event
+
+class RingQueue:
+    SENTINAL = object()
+
+    def __init__(self, capacity=8192):
+        size = 1 << (capacity - 1).bit_length()
+        self.slots = [None] * size
+        self.mask = size - 1
+        self.head = 0  # 소비자만 바꾼다.
+        self.tail = 0  # 생산자만 바꾼다.
+        self.completed = 0
+        self.not_empty = Event()
+        self.not_full = Event()
+        self.drained = Event()
+        self.consumer_waiting = False
+        self.producer_waiting = False
+        self.joining = False
+
+    # 기다리겠다고 표시하고 Event를 지운 뒤 조건을 다시 확인하므로, 그 사이에 상대가 깨운 신호를 놓치지 않는다.
+    def put(self, item):
+        while self.tail - self.head > self.mask:
+            self.producer_waiting = True
+            self.not_full.clear()
+            if self.tail - self.head > self.mask:
+                self.not_full.wait()
+            self.producer_waiting = False
+        self.slots[self.tail & self.mask] = item
+        self.tail += 1
+        if self.consumer_waiting:
+            self.not_empty.set()
+
+    def get(self):
+        while self.head == self.tail:
+            self.consumer_waiting = True
+            self.not_empty.clear()
+            if self.head == self.tail:
+                self.not_empty.wait()
+            self.consumer_waiting = False
+        index = self.head & self.mask
+        item = self.slots[index]
+        self.slots[index] = None
+        self.head += 1
+        if self.producer_waiting:
+            self.not_full.set()
+        return item
+
+    def qsize(self):
+        return self.tail - self.head
+
+    def task_done(self):
+        self.completed += 1
+        if self.joining and self.completed == self.tail:
+            self.drained.set()
+
+    def join(self):
+        while self.completed < self.tail:
+            self.joining = True
+            self.drained.clear()
+            if self.completed < self.tail:
+                self.drained.wait()
+            self.joining = False
+
+    def close(self):
+        self.put(self.SENTINAL)
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            try:
+                if item is self.SENTINAL:
+                    return
+                yield item
+            finally:
+                self.task_done()
+
+# 생산자 스레드 하나와 소비자 스레드 하나 사이의 전달 처리량을 비교한다.
+def handoff_throughput(queue_class, item_count):
+    queue = queue_class()
+    received = []
+    consumer = Thread(target=lambda: received.extend(queue))
+    start = time.perf_counter()
+    consumer.start()
+    for i in range(item_count):
+        queue.put(i)
+    queue.close()
+    consumer.join()
+    delta = time.perf_counter() - start
+    assert received == list(range(item_count))
+    return item_count / delta
+
+closable = handoff_throughput(ClosableQueue, 200_000)
+ring = handoff_throughput(RingQueue, 200_000)
+print(f'ClosableQueue: 초당 {closable:,.0f} 개, '
+      f'RingQueue: 초당 {ring:,.0f} 개 ({ring / closable:.1f} 배)')
+
+# 단계마다 작업자가 하나뿐인 파이프라인에서는 StoppableWorker와 stop_threads를 그대로 쓸 수 있다.
+download_queue = RingQueue()
+resize_queue = RingQueue()
+upload_queue = RingQueue()
+done_queue = RingQueue()
+threads = [
+    StoppableWorker(download, download_queue, resize_queue),
+    StoppableWorker(resize, resize_queue, upload_queue),
+    StoppableWorker(upload, upload_queue, done_queue),
+]
+for thread in threads:
+    thread.start()
+
+for _ in range(1000):
+    download_queue.put(object())
+
+stop_threads(download_queue, threads[:1])
+stop_threads(resize_queue, threads[1:2])
+stop_threads(upload_queue, threads[2:])
+print(done_queue.qsize(), '개의 원소가 처리됨')
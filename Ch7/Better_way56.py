@@ -2,6 +2,8 @@
 ALIVE = '*'
 EMPTY = '-'
 
+import io
+
 # 각 셀의 상태를 간단한 컨테이너 클래스를 사용해 표현할 수 있다.
 class Grid:
     def __init__(self, height, width):
@@ -17,13 +19,14 @@ class Grid:
     def set(self, y, x, state):
         self.rows[y % self.height][x % self.width] = state
     
+    # 문자열을 셀마다 이어 붙이지 않고, 행 문자열을 한 번씩만 만들어 파일 객체에 바로 쓴다.
+    def render(self, out):
+        out.writelines(''.join(row) + '\n' for row in self.rows)
+
     def __str__(self):
-        output = ''
-        for row in self.rows:
-            for cell in row:
-                output += cell
-            output += '\n'
-        return output
+        output = io.StringIO()
+        self.render(output)
+        return output.getvalue()
 
 grid = Grid(5, 9)
 grid.set(0, 3, ALIVE)
@@ -85,24 +88,26 @@ class ColumnPrinter:
         self.columns.append(data)
     
     def __str__(self):
-        row_count = 1
-        for data in self.columns:
-            row_count = max(
-                row_count, len(data.splitlines()) + 1
-            )
-        rows = [''] * row_count
+        output = io.StringIO()
+        self.render(output)
+        return output.getvalue()
+
+    # 각 열은 한 번만 줄 단위로 나누고, 완성된 행을 하나씩 파일 객체에 쓴다.
+    def render(self, out):
+        column_lines = [data.splitlines() for data in self.columns]
+        row_count = max([1] + [len(lines) + 1 for lines in column_lines])
         for j in range(row_count):
-            for i, data in enumerate(self.columns):
-                line = data.splitlines()[max(0, j-1)]
+            cells = []
+            for i, lines in enumerate(column_lines):
+                line = lines[max(0, j-1)]
                 if j == 0:
                     padding = ' ' * (len(line) // 2)
-                    rows[j] += padding + str(i) + padding
+                    cells.append(padding + str(i) + padding)
                 else:
-                    rows[j] += line
-                
-                if (i + 1) < len(self.columns):
-                    rows[j] += ' | '
-        return '\n'.join(rows)
+                    cells.append(line)
+            if j > 0:
+                out.write('\n')
+            out.write(' | '.join(cells))
 
 columns = ColumnPrinter()
 for i in range(5):
@@ -111,7 +116,609 @@ for i in range(5):
 
 print(columns)
 
+# 셀마다 get을 여덟 번 호출하는 대신, 그리드 전체를 uint8 배열로 저장하면 배열 연산으로 한 세대를 한꺼번에 계산할 수 있다.
+import numpy as np
+
+class ArrayGrid:
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.cells = np.zeros((height, width), dtype=np.uint8)
+
+    @classmethod
+    def from_grid(cls, grid):
+        array_grid = cls(grid.height, grid.width)
+        for y, row in enumerate(grid.rows):
+            for x, cell in enumerate(row):
+                array_grid.cells[y, x] = cell == ALIVE
+        return array_grid
+
+    def get(self, y, x):
+        if self.cells[y % self.height, x % self.width]:
+            return ALIVE
+        return EMPTY
+
+    def set(self, y, x, state):
+        self.cells[y % self.height, x % self.width] = state == ALIVE
+
+    def __str__(self):
+        chars = np.where(self.cells, ALIVE, EMPTY)
+        return ''.join(''.join(row) + '\n' for row in chars)
+
+# np.roll은 가장자리를 반대편으로 감싸므로 Grid.get의 모듈러 연산과 똑같이 토러스 형태로 이웃을 센다.
+def count_neighbors_vectorized(cells):
+    neighbors = np.zeros(cells.shape, dtype=np.uint8)
+    for dy, dx in [(-1, 0), (-1, 1), (0, 1), (1, 1),
+                   (1, 0), (1, -1), (0, -1), (-1, -1)]:
+        # 셀 (y, x)가 (y + dy, x + dx)를 보려면 배열을 반대 방향으로 밀어야 한다.
+        neighbors += np.roll(cells, (-dy, -dx), axis=(0, 1))
+    return neighbors
+
+# game_logic의 규칙을 불리언 마스크로 옮긴다.
+def game_logic_vectorized(cells, neighbors):
+    alive = cells == 1
+    survive = alive & ((neighbors == 2) | (neighbors == 3))
+    born = ~alive & (neighbors == 3)
+    return (survive | born).astype(np.uint8)
+
+def simulate_vectorized(grid):
+    next_grid = ArrayGrid(grid.height, grid.width)
+    neighbors = count_neighbors_vectorized(grid.cells)
+    next_grid.cells = game_logic_vectorized(grid.cells, neighbors)
+    return next_grid
+
+# 기존 simulate와 똑같은 결과를 내는지 확인한다.
+grid = Grid(5, 9)
+grid.set(0, 3, ALIVE)
+grid.set(1, 4, ALIVE)
+grid.set(2, 2, ALIVE)
+grid.set(2, 3, ALIVE)
+grid.set(2, 4, ALIVE)
+array_grid = ArrayGrid.from_grid(grid)
+for _ in range(20):
+    grid = simulate(grid)
+    array_grid = simulate_vectorized(array_grid)
+    assert str(grid) == str(array_grid)
+
+# 셀 단위로 계산하는 경로와 초당 세대 수를 비교한다.
+import random
+import time
+
+def random_grid(height, width, seed=1234):
+    rng = random.Random(seed)
+    grid = Grid(height, width)
+    for y in range(height):
+        for x in range(width):
+            if rng.random() < 0.3:
+                grid.set(y, x, ALIVE)
+    return grid
+
+def benchmark(simulate_func, grid, generations):
+    start = time.time()
+    for _ in range(generations):
+        grid = simulate_func(grid)
+    delta = time.time() - start
+    return generations / delta, grid
+
+grid = random_grid(200, 200)
+array_grid = ArrayGrid.from_grid(grid)
+slow_rate, grid = benchmark(simulate, grid, 3)
+fast_rate, array_grid = benchmark(simulate_vectorized, array_grid, 3)
+assert str(grid) == str(array_grid)
+print(f'셀 단위: 초당 {slow_rate:.2f} 세대, '
+      f'배열 연산: 초당 {fast_rate:.2f} 세대 '
+      f'({fast_rate / slow_rate:.0f} 배)')
+
+# 넘파이 없이도 각 행을 파이썬 정수 하나에 비트로 담으면 셀 하나에 1비트만 쓰고, 한 행의 모든 셀을 비트 연산으로 동시에 계산할 수 있다.
+class PackedGrid:
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.rows = [0] * height  # x번째 비트가 (y, x) 셀이다.
+
+    @classmethod
+    def from_grid(cls, grid):
+        packed = cls(grid.height, grid.width)
+        for y in range(grid.height):
+            for x in range(grid.width):
+                packed.set(y, x, grid.get(y, x))
+        return packed
+
+    def get(self, y, x):
+        if self.rows[y % self.height] >> (x % self.width) & 1:
+            return ALIVE
+        return EMPTY
+
+    def set(self, y, x, state):
+        bit = 1 << (x % self.width)
+        if state == ALIVE:
+            self.rows[y % self.height] |= bit
+        else:
+            self.rows[y % self.height] &= ~bit
+
+    def __str__(self):
+        output = []
+        for row in self.rows:
+            bits = format(row, f'0{self.width}b')[::-1]
+            output.append(bits.replace('1', ALIVE).replace('0', EMPTY))
+            output.append('\n')
+        return ''.join(output)
+
+    # 각 비트가 왼쪽/오른쪽 이웃을 보도록 행을 회전한다(가장자리는 반대편으로 감싼다).
+    def west(self, row):
+        return ((row << 1) & self.mask) | (row >> (self.width - 1))
+
+    def east(self, row):
+        return (row >> 1) | ((row & 1) << (self.width - 1))
+
+# 여덟 개의 이웃 비트열을 비트 단위 덧셈기로 더해, 모든 열의 이웃 수를 세 비트(s0, s1, s2)로 동시에 구한다.
+def count_neighbors_packed(neighbor_rows):
+    s0 = s1 = s2 = 0
+    for row in neighbor_rows:
+        c0 = s0 & row
+        s0 ^= row
+        c1 = s1 & c0
+        s1 ^= c0
+        s2 ^= c1  # 이웃이 여덟이면 0으로 넘치지만 어차피 죽는 셀이다.
+    return s0, s1, s2
+
+# 이웃 수가 3이거나, 살아 있으면서 2인 셀만 다음 세대에 살아 있다.
+def game_logic_packed(row, s0, s1, s2):
+    return s1 & ~s2 & (s0 | row)
+
+def simulate_packed(grid):
+    next_grid = PackedGrid(grid.height, grid.width)
+    rows = grid.rows
+    for y in range(grid.height):
+        above = rows[y - 1]
+        row = rows[y]
+        below = rows[(y + 1) % grid.height]
+        s0, s1, s2 = count_neighbors_packed([
+            above, grid.east(above), grid.east(row), grid.east(below),
+            below, grid.west(below), grid.west(row), grid.west(above),
+        ])
+        next_grid.rows[y] = game_logic_packed(row, s0, s1, s2) & grid.mask
+    return next_grid
+
+# get/set/__str__ 계약이 같으므로 기존 simulate와 ColumnPrinter에서도 그대로 쓸 수 있다.
+grid = Grid(5, 9)
+grid.set(0, 3, ALIVE)
+grid.set(1, 4, ALIVE)
+grid.set(2, 2, ALIVE)
+grid.set(2, 3, ALIVE)
+grid.set(2, 4, ALIVE)
+packed_grid = PackedGrid.from_grid(grid)
+columns = ColumnPrinter()
+for i in range(20):
+    if i < 5:
+        columns.append(str(packed_grid))
+    assert str(simulate(packed_grid)) == str(simulate_packed(packed_grid))
+    grid = simulate(grid)
+    packed_grid = simulate_packed(packed_grid)
+    assert str(grid) == str(packed_grid)
+
+print(columns)
+
+# 메모리 사용량과 초당 세대 수를 비교한다.
+import sys
+
+# Grid의 셀 문자열은 인터닝된 객체를 공유하므로 행 리스트의 포인터 크기만 센다.
+def grid_memory(grid):
+    return sys.getsizeof(grid.rows) + sum(
+        sys.getsizeof(row) for row in grid.rows)
+
+grid = random_grid(200, 200)
+packed_grid = PackedGrid.from_grid(grid)
+grid_bytes = grid_memory(grid)
+packed_bytes = grid_memory(packed_grid)
+slow_rate, grid = benchmark(simulate, grid, 3)
+fast_rate, packed_grid = benchmark(simulate_packed, packed_grid, 3)
+assert str(grid) == str(packed_grid)
+print(f'메모리: {grid_bytes} 바이트 -> {packed_bytes} 바이트 '
+      f'({grid_bytes / packed_bytes:.0f} 배 절약)')
+print(f'셀 단위: 초당 {slow_rate:.2f} 세대, '
+      f'비트 연산: 초당 {fast_rate:.2f} 세대 '
+      f'({fast_rate / slow_rate:.0f} 배)')
+
+# 대부분 비어 있는 보드라면 그리드를 타일로 나누고, 직전 세대에 바뀐 타일과 그 이웃 타일만 다시 계산하면 된다.
+def copy_grid(grid):
+    copied = Grid(grid.height, grid.width)
+    copied.rows = [list(row) for row in grid.rows]
+    return copied
+
+class TiledSimulator:
+    def __init__(self, grid, tile_size=16):
+        self.tile_size = tile_size
+        self.tiles_y = -(-grid.height // tile_size)
+        self.tiles_x = -(-grid.width // tile_size)
+        # 두 그리드를 번갈아 쓰기 때문에 세대마다 새 Grid를 만들지 않는다.
+        self.current = copy_grid(grid)
+        self.next = copy_grid(grid)
+        self.dirty = {(ty, tx)
+                      for ty in range(self.tiles_y)
+                      for tx in range(self.tiles_x)}
+        self.generation = 0
+
+    def tiles_to_visit(self):
+        visit = set()
+        for ty, tx in self.dirty:
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    visit.add(((ty + dy) % self.tiles_y,
+                               (tx + dx) % self.tiles_x))
+        return visit
+
+    def step_tile(self, ty, tx):
+        get = self.current.get
+        set_next = self.next.set
+        y_end = min((ty + 1) * self.tile_size, self.current.height)
+        x_end = min((tx + 1) * self.tile_size, self.current.width)
+        changed = False
+        for y in range(ty * self.tile_size, y_end):
+            for x in range(tx * self.tile_size, x_end):
+                state = get(y, x)
+                neighbors = count_neighbors(y, x, get)
+                next_state = game_logic(state, neighbors)
+                set_next(y, x, next_state)
+                if next_state != state:
+                    changed = True
+        return changed
+
+    # 방문하지 않은 타일은 직전 세대에 바뀌지 않았으므로, 두 세대 전의 내용이 남아 있는 버퍼도 이미 올바른 상태다.
+    def step(self):
+        changed = set()
+        for ty, tx in self.tiles_to_visit():
+            if self.step_tile(ty, tx):
+                changed.add((ty, tx))
+        self.current, self.next = self.next, self.current
+        self.dirty = changed
+        self.generation += 1
+
+# 주기적인 패턴은 유한한 토러스 위에서 결국 이전 상태로 돌아오므로, 주기를 찾으면 남은 세대를 주기로 나눠 건너뛸 수 있다.
+# 모든 세대의 보드를 기억하지 않도록 브렌트의 주기 검출 알고리즘을 쓴다. 2의 거듭제곱 세대마다 보드 한 벌만 저장해 두고 비교한다.
+# 세대마다 보드 전체를 훑지 않도록, 타일마다 해시를 두고 바뀐 타일의 해시만 다시 계산해 보드 해시를 갱신한다.
+def tile_digest(grid, ty, tx, tile_size):
+    y_start, x_start = ty * tile_size, tx * tile_size
+    rows = grid.rows[y_start:y_start + tile_size]
+    return hash((ty, tx, tuple(''.join(row[x_start:x_start + tile_size])
+                               for row in rows)))
+
+def simulate_n(grid, generations, tile_size=16, memoize=False):
+    simulator = TiledSimulator(grid, tile_size)
+    if memoize:
+        digests = {(ty, tx): tile_digest(simulator.current, ty, tx, tile_size)
+                   for ty in range(simulator.tiles_y)
+                   for tx in range(simulator.tiles_x)}
+        digest = sum(digests.values()) % 2**64
+        saved, saved_digest, saved_generation = copy_grid(grid), digest, 0
+        power = 1
+    while simulator.generation < generations:
+        if not simulator.dirty:
+            break  # 아무것도 바뀌지 않으면 이후 세대도 모두 같다.
+        simulator.step()
+        if not memoize:
+            continue
+        for ty, tx in simulator.dirty:
+            new_digest = tile_digest(simulator.current, ty, tx, tile_size)
+            digest += new_digest - digests[ty, tx]
+            digests[ty, tx] = new_digest
+        digest %= 2**64
+        generation = simulator.generation
+        # 해시가 같을 때만 저장해 둔 보드와 실제로 비교하므로 해시 충돌로 틀린 주기를 쓰지 않는다.
+        if digest == saved_digest and simulator.current.rows == saved.rows:
+            period = generation - saved_generation
+            generations = generation + (generations - generation) % period
+            memoize = False
+        elif generation - saved_generation == power:
+            saved, saved_digest, saved_generation = (
+                copy_grid(simulator.current), digest, generation)
+            power *= 2
+    return copy_grid(simulator.current)
+
+# 기존 simulate를 반복한 결과와 비교한다.
+grid = Grid(5, 9)
+grid.set(0, 3, ALIVE)
+grid.set(1, 4, ALIVE)
+grid.set(2, 2, ALIVE)
+grid.set(2, 3, ALIVE)
+grid.set(2, 4, ALIVE)
+expected = grid
+for generations in range(1, 50):
+    expected = simulate(expected)
+    assert str(simulate_n(grid, generations, tile_size=2)) == str(expected)
+
+# 글라이더는 5x9 토러스를 180 세대마다 한 바퀴 돌기 때문에, 10억 세대도 순식간에 계산할 수 있다.
+expected = grid
+for _ in range(10**9 % 180):
+    expected = simulate(expected)
+assert str(simulate_n(grid, 10**9, memoize=True)) == str(expected)
+
+# 넓은 보드에 글라이더가 몇 개만 있는 경우를 비교한다.
+def sparse_grid(height, width, gliders):
+    grid = Grid(height, width)
+    for i in range(gliders):
+        y, x = i * 37 % height, i * 53 % width
+        grid.set(y + 0, x + 1, ALIVE)
+        grid.set(y + 1, x + 2, ALIVE)
+        grid.set(y + 2, x + 0, ALIVE)
+        grid.set(y + 2, x + 1, ALIVE)
+        grid.set(y + 2, x + 2, ALIVE)
+    return grid
+
+grid = sparse_grid(128, 128, 3)
+start = time.time()
+expected = grid
+for _ in range(30):
+    expected = simulate(expected)
+slow_delta = time.time() - start
+
+start = time.time()
+result = simulate_n(grid, 30, tile_size=8)
+fast_delta = time.time() - start
+assert str(result) == str(expected)
+print(f'전체 셀: {slow_delta:.3f} 초, '
+      f'바뀐 타일만: {fast_delta:.3f} 초 '
+      f'({slow_delta / fast_delta:.0f} 배)')
+
+# 스레드로는 CPU 바운드 계산이 빨라지지 않으므로, 그리드를 가로 띠로 나눠 여러 프로세스에서 계산할 수 있다.
+# 보드는 공유 메모리에 두 벌(더블 버퍼) 두고, 각 프로세스는 자기 띠와 위아래 경계 행만 읽는다.
+import multiprocessing
+from multiprocessing import shared_memory
+from multiprocessing.pool import ThreadPool
+
+shared_board = None  # 작업자 프로세스마다 한 번만 공유 메모리에 연결한다.
+
+def attach_board(name, height, width):
+    global shared_board
+    shm = shared_memory.SharedMemory(name=name)
+    cells = np.ndarray((2, height, width), dtype=np.uint8, buffer=shm.buf)
+    shared_board = (shm, cells)
+
+def step_band(source, y_start, y_end):
+    _, cells = shared_board
+    height = cells.shape[1]
+    src = cells[source]
+    dst = cells[1 - source]
+    # 띠의 위아래로 경계 행을 하나씩 붙인다(토러스이므로 감싼다).
+    band = src[np.arange(y_start - 1, y_end + 1) % height]
+    band_height = y_end - y_start
+    neighbors = np.zeros((band_height, src.shape[1]), dtype=np.uint8)
+    for dy in (-1, 0, 1):
+        rows = band[1 + dy:1 + dy + band_height]
+        for dx in (-1, 0, 1):
+            if dy == 0 and dx == 0:
+                continue
+            neighbors += np.roll(rows, -dx, axis=1)
+    dst[y_start:y_end] = game_logic_vectorized(band[1:-1], neighbors)
+
+class ParallelSimulator:
+    def __init__(self, grid, workers=None, bands=None):
+        self.height = grid.height
+        self.width = grid.width
+        workers = workers or multiprocessing.cpu_count()
+        bands = bands or workers
+        edges = [self.height * i // bands for i in range(bands + 1)]
+        self.bands = [(edges[i], edges[i + 1])
+                      for i in range(bands) if edges[i] < edges[i + 1]]
+
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=2 * self.height * self.width)
+        self.cells = np.ndarray((2, self.height, self.width),
+                                dtype=np.uint8, buffer=self.shm.buf)
+        self.cells[0] = grid.cells
+        self.source = 0
+        # 작업자 풀은 세대마다 새로 만들지 않고 계속 재사용한다.
+        # 이 파일은 임포트될 때 앞의 예제를 모두 실행하므로, 스크립트를 다시 임포트하는 spawn 대신 fork로 작업자를 만든다.
+        # fork가 없는 플랫폼에서는 같은 인터페이스의 스레드 풀을 쓴다. numpy 연산은 GIL을 놓으므로 어느 정도 병렬로 실행된다.
+        if 'fork' in multiprocessing.get_all_start_methods():
+            pool_class = multiprocessing.get_context('fork').Pool
+        else:
+            print('fork를 쓸 수 없어 프로세스 풀 대신 스레드 풀로 실행합니다(numpy 연산 밖에서는 병렬로 실행되지 않음)')
+            pool_class = ThreadPool
+        self.pool = pool_class(
+            workers,
+            initializer=attach_board,
+            initargs=(self.shm.name, self.height, self.width))
+
+    def step(self, generations=1):
+        for _ in range(generations):
+            self.pool.starmap(
+                step_band,
+                [(self.source, y_start, y_end)
+                 for y_start, y_end in self.bands])
+            self.source = 1 - self.source
+
+    @property
+    def grid(self):
+        grid = ArrayGrid(self.height, self.width)
+        grid.cells = self.cells[self.source].copy()
+        return grid
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        del self.cells  # 버퍼를 참조하는 배열이 남아 있으면 공유 메모리를 닫을 수 없다.
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# 작은 보드에서 결과가 simulate_vectorized와 같은지 확인한 다음, 큰 보드로 시간을 잰다.
+array_grid = ArrayGrid.from_grid(random_grid(50, 40))
+with ParallelSimulator(array_grid, workers=2, bands=3) as simulator:
+    for _ in range(10):
+        array_grid = simulate_vectorized(array_grid)
+        simulator.step()
+        assert str(simulator.grid) == str(array_grid)
+
+# 큰 보드는 셀 단위로 만들면 느리므로 배열을 바로 채운다.
+array_grid = ArrayGrid(4096, 4096)
+rng = np.random.default_rng(1234)
+array_grid.cells = (rng.random((4096, 4096)) < 0.3).astype(np.uint8)
+start = time.time()
+expected = array_grid
+for _ in range(10):
+    expected = simulate_vectorized(expected)
+serial_delta = time.time() - start
+
+with ParallelSimulator(array_grid) as simulator:
+    start = time.time()
+    simulator.step(10)
+    parallel_delta = time.time() - start
+    assert np.array_equal(simulator.grid.cells, expected.cells)
+
+print(f'단일 프로세스: {serial_delta:.3f} 초, '
+      f'{multiprocessing.cpu_count()} 개 프로세스: '
+      f'{parallel_delta:.3f} 초')
+
+# 세대를 계속 출력할 때는 전체 보드 대신 직전 세대와 달라진 셀만 `y x 상태` 형식으로 쓸 수 있다.
+class GridRenderer:
+    def __init__(self, out, diff_only=False):
+        self.out = out
+        self.diff_only = diff_only
+        self.previous = None
+
+    def render(self, grid):
+        rows = [''.join(row) for row in grid.rows]
+        if self.previous is None:
+            self.out.writelines(row + '\n' for row in rows)
+        else:
+            self.write_diff(rows)
+        if self.diff_only:
+            self.previous = rows
+
+    def write_diff(self, rows):
+        self.out.write('\n')  # 세대 구분
+        for y, (old_row, new_row) in enumerate(zip(self.previous, rows)):
+            if old_row == new_row:
+                continue  # 바뀌지 않은 행은 문자열 비교 한 번으로 건너뛴다.
+            for x, (old, new) in enumerate(zip(old_row, new_row)):
+                if old != new:
+                    self.out.write(f'{y} {x} {new}\n')
+
+# 변경 내역을 첫 세대에 차례로 적용하면 마지막 세대를 다시 만들 수 있다.
+def replay_diff(lines, height, width):
+    grid = Grid(height, width)
+    lines = iter(lines)
+    for y in range(height):
+        grid.rows[y] = list(next(lines).rstrip('\n'))
+    for line in lines:
+        if line.strip():
+            y, x, state = line.split()
+            grid.set(int(y), int(x), state)
+    return grid
+
+grid = Grid(5, 9)
+grid.set(0, 3, ALIVE)
+grid.set(1, 4, ALIVE)
+grid.set(2, 2, ALIVE)
+grid.set(2, 3, ALIVE)
+grid.set(2, 4, ALIVE)
+output = io.StringIO()
+renderer = GridRenderer(output, diff_only=True)
+for _ in range(5):
+    renderer.render(grid)
+    last_grid = grid
+    grid = simulate(grid)
+
+print(output.getvalue())
+output.seek(0)
+assert str(replay_diff(output, 5, 9)) == str(last_grid)
+
+# 큰 보드도 행 수에 비례하는 시간 안에 출력된다.
+grid = random_grid(1000, 1000)
+start = time.time()
+GridRenderer(io.StringIO()).render(grid)
+delta = time.time() - start
+print(f'1000x1000 보드 출력에 {delta:.3f} 초 걸림')
+
+# 아래에서 game_logic을 다시 정의하므로, 원격 버전이 그대로 쓸 수 있도록 원래의 규칙을 남겨 둔다.
+rules = game_logic
+
 # game_logic 함수 안에서 약간의 I/O가 필요하면, 블로킹 I/O를 game_logic 함수 안에 직접 추가하면 된다.
 def game_logic(state, neighbors):
     # 블로킹 I/O를 여기서 수행한다.
-    data = my_socket.recv(100)
\ No newline at end of file
+    data = my_socket.recv(100)
+
+# game_logic을 코루틴으로 만들면 셀마다 기다리는 I/O를 한 세대 안에서 동시에 진행할 수 있다.
+# 동시에 진행하는 셀 수는 정해진 개수의 작업자 코루틴으로 제한해서, 셀이 수백만 개여도 코루틴을 셀 수만큼 만들지 않는다.
+import asyncio
+import inspect
+
+async def step_cell_async(y, x, get, set, logic):
+    state = get(y, x)
+    neighbors = count_neighbors(y, x, get)
+    next_state = logic(state, neighbors)
+    if inspect.isawaitable(next_state):
+        next_state = await next_state
+    set(y, x, next_state)
+
+async def simulate_async(grid, logic, concurrency=100):
+    next_grid = Grid(grid.height, grid.width)
+    cells = ((y, x) for y in range(grid.height) for x in range(grid.width))
+
+    async def worker():
+        for y, x in cells:
+            await step_cell_async(y, x, grid.get, next_grid.set, logic)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return next_grid
+
+# 테스트용으로 받은 줄을 지연 시간 뒤에 그대로 돌려주는 로컬 소켓 서버를 사용한다.
+async def start_echo_server(latency):
+    async def handle(reader, writer):
+        line = await reader.readline()
+        await asyncio.sleep(latency)
+        writer.write(line)
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+def make_remote_game_logic(host, port):
+    async def game_logic(state, neighbors):
+        # 여기서 I/O를 수행한다.
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f'{state} {neighbors}\n'.encode())
+        await writer.drain()
+        data = await reader.readline()
+        writer.close()
+        await writer.wait_closed()
+        state, neighbors = data.decode().split()
+        return rules(state, int(neighbors))
+
+    return game_logic
+
+async def run_async_simulation(grid, generations, latency):
+    server = await start_echo_server(latency)
+    host, port = server.sockets[0].getsockname()[:2]
+    logic = make_remote_game_logic(host, port)
+    async with server:
+        columns = ColumnPrinter()
+        for _ in range(generations):
+            columns.append(str(grid))
+            grid = await simulate_async(grid, logic)
+    return grid, columns
+
+# 셀 45개가 각각 0.1초씩 기다리지만, 한 세대는 합계(4.5초)가 아니라 가장 긴 지연 시간 정도만 걸린다.
+grid = Grid(5, 9)
+grid.set(0, 3, ALIVE)
+grid.set(1, 4, ALIVE)
+grid.set(2, 2, ALIVE)
+grid.set(2, 3, ALIVE)
+grid.set(2, 4, ALIVE)
+expected = ArrayGrid.from_grid(grid)
+for _ in range(5):
+    expected = simulate_vectorized(expected)
+
+start = time.time()
+grid, columns = asyncio.run(run_async_simulation(grid, 5, 0.1))
+delta = time.time() - start
+assert str(grid) == str(expected)
+print(columns)
+print(f'5 세대에 {delta:.3f} 초 걸림')